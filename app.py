@@ -1,12 +1,24 @@
 from flask import Flask, render_template, request, redirect, session, flash, g, jsonify
 from flask_debugtoolbar import DebugToolbarExtension
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError
-from models import connect_db, db, Member, WorkoutExercise, Exercise, Workout
-from forms import ExerciseForm, MemberAddForm, LoginForm, MemberEditForm
-import requests
+from sqlalchemy.dialects.postgresql import insert as upsert
+from models import connect_db, db, Member, TimelineEntry, WorkoutExercise, Exercise, ExerciseSet, Workout, WorkoutSubmission, WorkoutTemplate, WorkoutTemplateExercise
+from forms import ExerciseForm, MemberAddForm, LoginForm, MemberEditForm, WorkoutTemplateForm
+from compression import init_compression
+from templating import init_templates
+from recommendations import ExerciseRecommender
+import exercise_api
+from catalog import SharedCatalog
+from autocomplete import ExerciseNameIndex
+from profiling import init_profiling
+from progression import personal_records, estimated_1rm_trend
+from timeline import fan_out_workout, backfill_timeline, read_timeline
 import json
+import math
 import os
-from datetime import datetime
+import uuid
+from datetime import date, datetime
 
 
 CURR_MEMBER_KEY = "curr_member"
@@ -21,23 +33,68 @@ app.config["SQLALCHEMY_ECHO"] = os.environ.get("SQLALCHEMY_ECHO", True)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "abc123")
 app.config["DEBUG_TB_INTERCEPT_REDIRECTS"] = os.environ.get(
     "DEBUG_TB_INTERCEPT_REDIRECTS", False)
+app.config["RECOMMENDATION_SNAPSHOT"] = os.environ.get(
+    "RECOMMENDATION_SNAPSHOT", os.path.join(app.instance_path, "recommendations.json"))
+app.config["EXERCISE_CATALOG"] = os.environ.get(
+    "EXERCISE_CATALOG", os.path.join(app.instance_path, "exercise_catalog.bin"))
+# a bounded connection pool per worker process: with gevent workers (see gunicorn.conf.py) hundreds of requests
+# share one process, and those beyond pool size + overflow wait up to the pool timeout (seconds) for a connection
+# instead of opening more than Postgres allows
+app.config["SQLALCHEMY_POOL_SIZE"] = int(
+    os.environ.get("SQLALCHEMY_POOL_SIZE", 10))
+app.config["SQLALCHEMY_MAX_OVERFLOW"] = int(
+    os.environ.get("SQLALCHEMY_MAX_OVERFLOW", 5))
+app.config["SQLALCHEMY_POOL_TIMEOUT"] = int(
+    os.environ.get("SQLALCHEMY_POOL_TIMEOUT", 10))
+
+# compress HTML responses and serve precompressed static files. Registered before the debug toolbar, since
+# Flask runs after_request functions in reverse, so the toolbar is added to the HTML before it's compressed;
+# and before add_member_to_g, so static file requests don't query the database for the member
+init_compression(app)
 
 toolbar = DebugToolbarExtension(app)
 
+# compiled templates shared by every worker through a bytecode cache; no auto-reload outside debug mode
+init_templates(app)
+
 app.app_context().push()
 
 connect_db(app)
-db.create_all()
+
+# only an empty (development) database gets its tables from db.create_all(). A database that already has tables
+# gets its schema from migrations/ (see the README): creating the tables newer models add before the migrations
+# run would leave them unpartitioned and make those migrations fail
+if not inspect(db.engine).get_table_names():
+    db.create_all()
+
+# opt-in request profiling (X-Profile header or PROFILE_SAMPLE_RATE) and logging of SQL slower than SLOW_QUERY_MS
+init_profiling(app, db.engine)
+
+# "members who did X also did Y" counts, kept in memory and caught up from the workout_exercises table
+recommender = ExerciseRecommender(app.config["RECOMMENDATION_SNAPSHOT"])
+
+# read-only exercise catalog snapshot, memory-mapped and shared by every worker process
+catalog = SharedCatalog(app.config["EXERCISE_CATALOG"])
+
+# in-memory prefix index of exercise names for search-as-you-type
+exercise_names = ExerciseNameIndex()
 
 
 # ##############################################################################
 # Member signup/login/logout
 
+# endpoints called on every keystroke, which only need to know someone is logged in, not load the member
+SKIP_MEMBER_ENDPOINTS = {'autocomplete_exercises'}
+
+
 @app.before_request
 def add_member_to_g():
     """If we're logged in, add curr member to Flask global 'g'"""
 
-    if CURR_MEMBER_KEY in session:
+    if request.endpoint in SKIP_MEMBER_ENDPOINTS:
+        g.member = None
+
+    elif CURR_MEMBER_KEY in session:
         g.member = Member.query.get(session[CURR_MEMBER_KEY])
 
     else:
@@ -144,6 +201,29 @@ def homepage():
 ###################################################################################
 # Member pages
 
+WORKOUTS_PER_PAGE = 50
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query string value; raises ValueError if it isn't one"""
+
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def member_workouts_query(member_id, before=None):
+    """Query for a page of the member's log of workouts: those older than `before` (all if None), newest first"""
+
+    query = Workout.query.filter(Workout.member_id == member_id)
+    if before:
+        query = query.filter(Workout.workout_date < before)
+
+    # retrieve workouts from database in descending order of date created; member.workouts won't be in order by default
+    # (one extra workout is retrieved to find out whether there's an older page)
+    return (query
+            .order_by(Workout.workout_date.desc())
+            .limit(WORKOUTS_PER_PAGE + 1))
+
+
 @app.route('/members/<int:member_id>')
 def show_member(member_id):
     """Show a page with info on a specific member and their log of workouts"""
@@ -151,15 +231,27 @@ def show_member(member_id):
     # retrieve member info from database based on their member_id
     member = Member.query.get_or_404(member_id)
 
-    # retrieve workouts from database in descending order of date created; member.workouts won't be in order by default
-    workouts = (Workout
-                .query
-                .filter(Workout.member_id == member_id)
-                .order_by(Workout.workout_date.desc())
-                .all())
+    # show the log a page at a time: the workouts older than the 'before' date, newest first. Filtering and
+    # ordering on workout_date lets Postgres read only the monthly partitions the page needs
+    before = request.args.get('before', type=parse_date)
+
+    workouts = member_workouts_query(member_id, before).all()
+    older = workouts[WORKOUTS_PER_PAGE - 1].workout_date if len(
+        workouts) > WORKOUTS_PER_PAGE else None
+    workouts = workouts[:WORKOUTS_PER_PAGE]
+
+    # the member's saved workout templates, only shown on their own profile
+    templates = []
+    if g.member and g.member.id == member_id:
+        templates = (WorkoutTemplate
+                     .query
+                     .filter(WorkoutTemplate.member_id == member_id)
+                     .order_by(WorkoutTemplate.name)
+                     .all())
+
     # if member has workouts created:
     if workouts:
-        return render_template('member_profile.html', member=member, workouts=workouts)
+        return render_template('member_profile.html', member=member, workouts=workouts, templates=templates, older=older)
 
     # if no workouts are in the member profile:
     else:
@@ -207,15 +299,89 @@ def delete_member():
     # call function to delete member from database
     do_logout()
 
+    # the member's workouts, their workout_exercises rows and templates are removed by the
+    # database's ON DELETE CASCADE foreign keys, so this is a single DELETE however long the history
     db.session.delete(g.member)
     db.session.commit()
 
     return redirect("/signup")
 
 
+@app.route('/members/follow/<int:follow_id>', methods=['POST'])
+def add_follow(follow_id):
+    """Add a follow for the currently-logged-in member, and put the followed member's recent workouts in their feed"""
+
+    if not g.member:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    followed_member = Member.query.get_or_404(follow_id)
+
+    if followed_member.id != g.member.id and not g.member.is_following(followed_member):
+        g.member.following.append(followed_member)
+        backfill_timeline(g.member.id, followed_member.id)
+        db.session.commit()
+
+    return redirect(f"/members/{follow_id}")
+
+
+@app.route('/members/stop-following/<int:follow_id>', methods=['POST'])
+def stop_following(follow_id):
+    """Have currently-logged-in member stop following this member, and take their workouts out of the feed"""
+
+    if not g.member:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    followed_member = Member.query.get_or_404(follow_id)
+
+    if g.member.is_following(followed_member):
+        g.member.following.remove(followed_member)
+        db.session.execute(TimelineEntry.__table__.delete().where(db.and_(
+            TimelineEntry.member_id == g.member.id, TimelineEntry.author_id == followed_member.id)))
+        db.session.commit()
+
+    return redirect(f"/members/{follow_id}")
+
+
+@app.route('/feed')
+def show_feed():
+    """Show the recent workouts of the members the logged in member follows, a page at a time (older pages after
+    the workout date 'before' and entry 'before_id')"""
+
+    if not g.member:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    before_date = request.args.get('before', type=date.fromisoformat)
+    before_id = request.args.get('before_id', type=int)
+    before = (before_date, before_id) if before_date and before_id else None
+
+    entries, older = read_timeline(g.member.id, before=before)
+
+    return render_template('feed.html', entries=entries, older=older)
+
+
 ###################################################################################
 # Exercise pages
 
+
+def fetch_exercises(**params):
+    """Look up exercises from the API (see exercise_api.fetch_exercises), first giving the request's pooled database
+    connection back so it isn't held while waiting on the API; the next query takes one again.
+
+    Nothing has been written yet when the exercise pages call this, so the session is closed rather than committed:
+    a commit would expire g.member and base.html would take a connection again just to reload the member's name.
+    Closing keeps g.member's loaded attributes, and merging it back without loading re-attaches it with no query."""
+
+    db.session.close()
+
+    if g.member:
+        g.member = db.session.merge(g.member, load=False)
+
+    return exercise_api.fetch_exercises(**params)
+
+
 @app.route('/exercises')
 def show_exercise_choices():
     """Show choices of exercises page if member is logged in; otherwise, redirect to login page"""
@@ -234,14 +400,14 @@ def show_cardio_exercises():
     type = 'cardio'
     name = 'Cardio'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -264,14 +430,14 @@ def show_olympic_weightlifting_exercises():
     type = 'olympic_weightlifting'
     name = 'Olympic Weightlifting'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -294,14 +460,14 @@ def show_plyometric_exercises():
     type = 'plyometrics'
     name = 'Plyometric'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -324,14 +490,14 @@ def show_powerlifting_exercises():
     type = 'powerlifting'
     name = 'Powerlifting'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -354,14 +520,14 @@ def show_strength_exercises():
     type = 'strength'
     name = 'Strength'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -384,14 +550,14 @@ def show_stretching_exercises():
     type = 'stretching'
     name = 'Stretching'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -414,14 +580,14 @@ def show_strongman_exercises():
     type = 'strongman'
     name = 'Strongman'
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?type={}'.format(type)
-
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+    if not g.member:
+        flash("Ooops something went wrong. Please try again", 'danger')
+        return redirect('/')
 
-    if g.member and response.status_code == requests.codes.ok:
+    # concurrent requests for the same category share one API request
+    results = fetch_exercises(type=type)
 
-        results = response.json()
+    if results is not None:
 
         # removes any duplicated exercises from API response by only adding unique exercises to non_duplicated_results list
         for result in results:
@@ -436,6 +602,12 @@ def show_strongman_exercises():
         return redirect('/')
 
 
+def exercise_named_query(name):
+    """Query for the exercises with a name (looked up with the index on exercises.name)"""
+
+    return Exercise.query.filter_by(name=name)
+
+
 @app.route('/exercises/<path:exercise>')
 def exercise_description(exercise):
     """Show details and options about a specific exercise """
@@ -445,25 +617,37 @@ def exercise_description(exercise):
     name = f"{exercise}"
     member = g.member
 
-    api_url = 'https://api.api-ninjas.com/v1/exercises?name={}'.format(name)
+    # show the details of an exercise that's already in the shared catalog without asking the API
+    if type == None and g.member:
+        catalog_exercise = catalog.find(name)
 
-    response = requests.get(
-        api_url, headers={'X-Api-Key': '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv'})
+        if catalog_exercise:
+            recommender.refresh()
+            also_did = recommender.top(catalog_exercise.name)
 
-    results = []
+            return render_template('exercise_detail2.html', name=name, member_id=member.id, workout_id=workout_id, exercise=catalog_exercise, also_did=also_did)
 
     if not g.member:
         flash("Ooops something went wrong. Please try again", 'danger')
         return redirect('/')
 
-    elif response.status_code == requests.codes.ok:
+    # concurrent requests for the same exercise share one API request
+    api_results = fetch_exercises(name=name)
+
+    results = []
+
+    if api_results is not None:
 
-        for resp in response.json():
+        for resp in api_results:
             # retrieve first exercise in database with specific name
-            exercise = Exercise.query.filter_by(name=resp.get('name')).first()
+            exercise = exercise_named_query(resp.get('name')).first()
             # shows the details of an exercise
             if type == None:
-                return render_template('exercise_detail2.html', name=name, member_id=member.id, workout_id=workout_id, exercise=exercise, response=response.json())
+                # exercises most often saved to the same workouts as this one
+                recommender.refresh()
+                also_did = recommender.top(exercise.name) if exercise else []
+
+                return render_template('exercise_detail2.html', name=name, member_id=member.id, workout_id=workout_id, exercise=exercise, response=api_results, also_did=also_did)
 
             # adds a new exercise from the API to the database and the 'results' list if it's not already in there
             elif exercise == None or resp.get('name') != exercise.name:
@@ -481,13 +665,166 @@ def exercise_description(exercise):
 
         db.session.commit()
 
-    return render_template('exercise_detail1.html', type=type, results=results, name=name, member=member)
+        # make the new exercises searchable right away in this worker; other workers catch up on their own
+        for result in results:
+            exercise_names.add(result.name)
+
+    # a new idempotency key for the form, so submitting it twice only adds the exercises once
+    submission_key = uuid.uuid4()
+
+    return render_template('exercise_detail1.html', type=type, results=results, name=name, member=member, submission_key=submission_key)
+
+
+@app.route('/api/exercises/autocomplete')
+def autocomplete_exercises():
+    """Return JSON of up to 10 exercise names matching the text typed so far (the 'q' query parameter)"""
+
+    if CURR_MEMBER_KEY not in session:
+        return jsonify(error="Access unauthorized."), 401
+
+    exercise_names.refresh()
+
+    return jsonify(exercises=exercise_names.complete(request.args.get('q', '')))
 
 
 ###################################################################################
 # Workout pages
 
 
+def workout_on_query(member_id, day):
+    """Query for the member's workout on a day"""
+
+    return Workout.query.filter_by(workout_date=day, member_id=member_id)
+
+
+def get_todays_workout(member_id):
+    """Retrieve the member's workout for today, creating it (and adding it to the database session) if it doesn't exist yet"""
+
+    today = datetime.now().date()
+
+    # retrieve a specific workout based on the date it was created and the member_id
+    query = workout_on_query(member_id, today)
+    workout = query.first()
+
+    # if there isn't one yet, insert it unless a concurrent request just did (the unique index on member_id and
+    # workout_date decides), then retrieve whichever one was saved
+    if not workout:
+        db.session.execute(upsert(Workout.__table__)
+                           .values(member_id=member_id, workout_date=today)
+                           .on_conflict_do_nothing(index_elements=['member_id', 'workout_date']))
+        workout = query.one()
+
+    return workout
+
+
+def get_workout_or_404(workout_id):
+    """Retrieve a workout by id. If the request says which date the workout is from (the 'date' query string
+    value), only that day's partition of the workouts table is searched"""
+
+    query = Workout.query.filter(Workout.id == workout_id)
+
+    workout_date = request.args.get('date', type=parse_date)
+    if workout_date:
+        query = query.filter(Workout.workout_date == workout_date)
+
+    return query.first_or_404()
+
+
+def workout_exercises_query(workout_id, workout_date):
+    """Query for a workout's exercises in the order they were added, reading only the workout's date partition of workout_exercises"""
+
+    return (Exercise
+            .query
+            .join(WorkoutExercise, WorkoutExercise.exercise_id == Exercise.id)
+            .filter(WorkoutExercise.workout_id == workout_id,
+                    WorkoutExercise.workout_date == workout_date)
+            .order_by(WorkoutExercise.id))
+
+
+def get_workout_exercises(workout):
+    """Retrieve a workout's exercises in the order they were added"""
+
+    return workout_exercises_query(workout.id, workout.workout_date).all()
+
+
+def get_workout_sets(workout):
+    """Retrieve the sets logged in a workout as a dict of exercise id to that exercise's sets, in order"""
+
+    sets = {}
+
+    for exercise_set in (ExerciseSet
+                         .query
+                         .filter(ExerciseSet.workout_id == workout.id,
+                                 ExerciseSet.workout_date == workout.workout_date)
+                         .order_by(ExerciseSet.exercise_id, ExerciseSet.set_number)):
+        sets.setdefault(exercise_set.exercise_id, []).append(exercise_set)
+
+    return sets
+
+
+def parse_set_rows(form):
+    """Parse the rows of the multi-set form into dicts of ExerciseSet values, skipping blank rows.
+
+    Every row sends exercise_id, reps, weight, duration and rpe, so each is a list with one value per row.
+    Raises ValueError if a value isn't a number in range."""
+
+    columns = {'reps': int, 'weight': float, 'duration': int, 'rpe': float}
+    exercise_ids = form.getlist('exercise_id')
+    values = {column: form.getlist(column) for column in columns}
+
+    rows = []
+    for i, exercise_id in enumerate(exercise_ids):
+        row = {'exercise_id': int(exercise_id)}
+
+        for column, convert in columns.items():
+            value = values[column][i].strip() if i < len(values[column]) else ''
+            row[column] = convert(value) if value else None
+
+            if row[column] is not None and (row[column] < 0 or not math.isfinite(row[column])):
+                raise ValueError(f"{column} must be a number, at least 0")
+
+        if row['rpe'] is not None and not 1 <= row['rpe'] <= 10:
+            raise ValueError("RPE must be between 1 and 10")
+
+        # a row with nothing filled in is a set the member didn't do
+        if any(row[column] is not None for column in columns):
+            rows.append(row)
+
+    return rows
+
+
+def insert_workout_exercises(workout, exercise_id, whereclause, order_by):
+    """Add to `workout` every exercise id selected by the `exercise_id` column where `whereclause` holds, in a single
+    INSERT ... SELECT into workout_exercises. Each row gets the workout's date, which picks its partition.
+    Exercises already in the workout are skipped. Returns the number of exercises added"""
+
+    rows = (db.select([db.literal(workout.id, db.Integer), exercise_id, db.literal(workout.workout_date, db.Date)])
+            .where(whereclause)
+            .order_by(order_by))
+
+    result = db.session.execute(upsert(WorkoutExercise.__table__)
+                                .from_select(['workout_id', 'exercise_id', 'workout_date'], rows)
+                                .on_conflict_do_nothing(index_elements=['workout_id', 'exercise_id', 'workout_date']))
+
+    return result.rowcount
+
+
+def claim_submission(member_id, key):
+    """Record a form's idempotency key. Returns False if that form was already submitted (or is being submitted
+    right now by a concurrent request), True otherwise, including for a missing or malformed key"""
+
+    try:
+        key = str(uuid.UUID(key))
+    except (TypeError, ValueError):
+        return True
+
+    result = db.session.execute(upsert(WorkoutSubmission.__table__)
+                                .values(key=key, member_id=member_id, created_at=datetime.utcnow())
+                                .on_conflict_do_nothing(index_elements=['key']))
+
+    return result.rowcount == 1
+
+
 @app.route('/members/<int:member_id>/workout_page', methods=["GET", "POST"])
 def add_exercises_to_workout(member_id):
     """Retrieve a list of the exercises selected with checked boxes by a member and add them to the member's workout page"""
@@ -503,27 +840,30 @@ def add_exercises_to_workout(member_id):
     # retrieve the exercises selected with checked boxes
     selected_exercises = request.form.getlist('type-of-exercise')
 
-    # retrieve a specific workout based on the date it was created and the member_id
-    workout = Workout.query.filter_by(
-        workout_date=today_date, member_id=g.member.id).first()
+    workout = get_todays_workout(g.member.id)
+    added = 0
 
-    # if there isn't a workout fitting the above criteria in the database, create that workout and add it to the database
-    if not workout:
+    # add every exercise in the database with one of the selected names to today's workout, in one statement.
+    # A form submitted again (double click, back button) has the same key and adds nothing
+    if selected_exercises and claim_submission(g.member.id, request.form.get('submission_key')):
+        added = insert_workout_exercises(workout, Exercise.id, Exercise.name.in_(
+            selected_exercises), Exercise.id)
 
-        workout = Workout(member_id=g.member.id, workout_date=today_date)
-        db.session.add(workout)
+    db.session.commit()
 
-    # loop through the list of 'selected_exercises':
-    for exercise_name in selected_exercises:
-        # retrieve all the exercises in the database with the name of the iterated exercise ('exercise_name') in the 'selected_exercise's list
-        existing_exercises = Exercise.query.filter_by(name=exercise_name).all()
-        # if an exercise exists in the database (in existing_exercies), add it to the exercises of the specific workout retrieved above
-        for exercise in existing_exercises:
-            workout.exercises.append(exercise)
+    exercises = get_workout_exercises(workout)
 
-    db.session.commit()
+    # put the updated workout at the top of each follower's feed
+    if added:
+        fan_out_workout(workout, [exercise.name for exercise in exercises])
 
-    return render_template('member_workout_page.html', type=type, date=today_date, workout=workout, member_id=member_id)
+    # count the newly saved exercises towards recommendations and suggest exercises that go with today's workout
+    recommender.catch_up()
+    suggestions = recommender.suggest_for(
+        exercise.name for exercise in exercises)
+    sets = get_workout_sets(workout)
+
+    return render_template('member_workout_page.html', type=type, date=today_date, workout=workout, exercises=exercises, sets=sets, member_id=member_id, suggestions=suggestions)
 
 
 @app.route("/members/<int:member_id>/workouts/<int:workout_id>", methods=["GET"])
@@ -533,6 +873,197 @@ def show_member_workout(member_id, workout_id):
     member_id = g.member.id
 
     # retrieve data about a specific workout based on its id
-    workout = Workout.query.get_or_404(workout_id)
+    workout = get_workout_or_404(workout_id)
+    exercises = get_workout_exercises(workout)
+    sets = get_workout_sets(workout)
+
+    form = WorkoutTemplateForm()
+
+    return render_template('workout_detail.html', workout=workout, exercises=exercises, sets=sets, member_id=member_id, workout_id=workout_id, form=form)
+
+
+@app.route("/members/<int:member_id>/workouts/<int:workout_id>/sets", methods=["POST"])
+def log_sets(member_id, workout_id):
+    """Save every set filled in on the multi-set form of one of the member's workouts, in one bulk insert"""
+
+    workout = get_workout_or_404(workout_id)
+
+    if not g.member or workout.member_id != g.member.id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    try:
+        rows = parse_set_rows(request.form)
+    except ValueError:
+        flash("Please enter whole numbers for reps and seconds, numbers for weight, and an RPE from 1 to 10.", 'danger')
+        return redirect(f"/members/{g.member.id}/workout_page")
+
+    # only exercises that are part of this workout can have sets logged
+    workout_exercise_ids = {exercise.id for exercise in get_workout_exercises(workout)}
+    rows = [row for row in rows if row['exercise_id'] in workout_exercise_ids]
+
+    if not rows:
+        flash("Fill in reps, weight or time for at least one set.", 'warning')
+        return redirect(f"/members/{g.member.id}/workouts/{workout.id}?date={workout.workout_date}")
+
+    # lock the workout's row so concurrent submissions for it number their sets one after the other
+    (db.session
+     .query(Workout.id)
+     .filter(Workout.id == workout.id, Workout.workout_date == workout.workout_date)
+     .with_for_update()
+     .one())
+
+    # number the new sets after the ones already logged for each exercise
+    set_numbers = dict(db.session
+                       .query(ExerciseSet.exercise_id, db.func.max(ExerciseSet.set_number))
+                       .filter(ExerciseSet.workout_id == workout.id,
+                               ExerciseSet.workout_date == workout.workout_date)
+                       .group_by(ExerciseSet.exercise_id)
+                       .all())
+
+    for row in rows:
+        set_numbers[row['exercise_id']] = set_numbers.get(row['exercise_id'], 0) + 1
+        row.update(member_id=g.member.id, workout_id=workout.id,
+                   workout_date=workout.workout_date, set_number=set_numbers[row['exercise_id']])
+
+    # one executemany INSERT for the whole form instead of an ORM object per set
+    db.session.execute(ExerciseSet.__table__.insert(), rows)
+    db.session.commit()
+
+    flash(f"Logged {len(rows)} sets!", 'success')
+    return redirect(f"/members/{g.member.id}/workouts/{workout.id}?date={workout.workout_date}")
+
+
+@app.route('/api/members/<int:member_id>/records')
+def show_personal_records(member_id):
+    """Return JSON of the member's personal records: for each exercise, the heaviest set and the best estimated 1RM"""
+
+    if not g.member:
+        return jsonify(error="Access unauthorized."), 401
+
+    Member.query.get_or_404(member_id)
+
+    return jsonify(records=personal_records(member_id))
+
+
+@app.route('/api/members/<int:member_id>/exercises/<int:exercise_id>/progression')
+def show_exercise_progression(member_id, exercise_id):
+    """Return JSON of the member's estimated 1RM of an exercise for each day they trained it, oldest first.
+    The 'since' query string value (YYYY-MM-DD) limits it to recent days"""
+
+    if not g.member:
+        return jsonify(error="Access unauthorized."), 401
+
+    Member.query.get_or_404(member_id)
+    exercise = Exercise.query.get_or_404(exercise_id)
+
+    try:
+        since = parse_date(request.args['since']) if 'since' in request.args else date.min
+    except ValueError:
+        return jsonify(error="since must be a date like 2023-05-24."), 400
+
+    return jsonify(exercise={'id': exercise.id, 'name': exercise.name},
+                   progression=estimated_1rm_trend(member_id, exercise_id, since))
+
+
+@app.route("/members/<int:member_id>/workouts/<int:workout_id>/repeat", methods=["POST"])
+def repeat_workout(member_id, workout_id):
+    """Add every exercise of one of the member's earlier workouts to today's workout"""
+
+    workout = get_workout_or_404(workout_id)
+
+    if not g.member or workout.member_id != g.member.id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    todays_workout = get_todays_workout(g.member.id)
+
+    # exercises already in today's workout (all of them, when repeating today's workout) are skipped
+    added = insert_workout_exercises(todays_workout, WorkoutExercise.exercise_id,
+                                     db.and_(WorkoutExercise.workout_id == workout.id,
+                                             WorkoutExercise.workout_date == workout.workout_date),
+                                     WorkoutExercise.id)
+
+    db.session.commit()
+    recommender.catch_up()
+
+    if added:
+        fan_out_workout(todays_workout, [
+                        exercise.name for exercise in get_workout_exercises(todays_workout)])
+
+    return redirect(f"/members/{g.member.id}/workout_page")
+
+
+@app.route("/members/<int:member_id>/workouts/<int:workout_id>/template", methods=["POST"])
+def save_workout_template(member_id, workout_id):
+    """Save the exercises of one of the member's workouts as a named template"""
+
+    workout = get_workout_or_404(workout_id)
+
+    if not g.member or workout.member_id != g.member.id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    form = WorkoutTemplateForm()
+
+    if form.validate_on_submit():
+        template = WorkoutTemplate(member_id=g.member.id, name=form.name.data)
+        db.session.add(template)
+        db.session.flush()
+
+        # copy each of the workout's exercises once, in a single INSERT ... SELECT
+        rows = (db.select([db.literal(template.id, db.Integer), WorkoutExercise.exercise_id])
+                .where(db.and_(WorkoutExercise.workout_id == workout.id,
+                               WorkoutExercise.workout_date == workout.workout_date))
+                .distinct())
+        db.session.execute(WorkoutTemplateExercise.__table__.insert().from_select(
+            ['template_id', 'exercise_id'], rows))
+
+        db.session.commit()
+
+        flash(f"Saved template {template.name}!", 'success')
+        return redirect(f"/members/{g.member.id}")
+
+    flash("Please give the template a name.", 'danger')
+    return redirect(f"/members/{g.member.id}/workouts/{workout.id}?date={workout.workout_date}")
+
+
+@app.route("/members/<int:member_id>/templates/<int:template_id>/start", methods=["POST"])
+def start_workout_from_template(member_id, template_id):
+    """Add every exercise of one of the member's templates to today's workout"""
+
+    template = WorkoutTemplate.query.get_or_404(template_id)
+
+    if not g.member or template.member_id != g.member.id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    todays_workout = get_todays_workout(g.member.id)
+
+    added = insert_workout_exercises(todays_workout, WorkoutTemplateExercise.exercise_id,
+                                     WorkoutTemplateExercise.template_id == template.id, WorkoutTemplateExercise.id)
+
+    db.session.commit()
+    recommender.catch_up()
+
+    if added:
+        fan_out_workout(todays_workout, [
+                        exercise.name for exercise in get_workout_exercises(todays_workout)])
+
+    return redirect(f"/members/{g.member.id}/workout_page")
+
+
+@app.route("/members/<int:member_id>/templates/<int:template_id>/delete", methods=["POST"])
+def delete_workout_template(member_id, template_id):
+    """Delete one of the member's templates"""
+
+    template = WorkoutTemplate.query.get_or_404(template_id)
+
+    if not g.member or template.member_id != g.member.id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    db.session.delete(template)
+    db.session.commit()
 
-    return render_template('workout_detail.html', workout=workout, member_id=member_id, workout_id=workout_id)
+    return redirect(f"/members/{g.member.id}")
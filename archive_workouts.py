@@ -0,0 +1,149 @@
+"""Workout table maintenance for Capstone One Project
+
+The workouts and workout_exercises tables are partitioned by month (see
+migrations/034_partition_workouts.sql). This command keeps them in shape:
+
+    python archive_workouts.py ensure [--months-ahead 12]
+        create the monthly partitions for the coming months (run it monthly, e.g. from cron),
+        moving those months' rows that landed in the DEFAULT partition into them
+
+    python archive_workouts.py archive --tablespace workout_archive [--older-than 12]
+        move the partitions of months older than --older-than months to a tablespace on
+        compressed storage (created beforehand with CREATE TABLESPACE, e.g. on a ZFS or
+        btrfs volume with compression turned on)
+
+    python archive_workouts.py expire-submissions [--older-than-days 7]
+        delete the add-to-workout form idempotency keys (see
+        migrations/039_dedup_workouts.sql) older than --older-than-days days; run it
+        daily, e.g. from cron. A form resubmitted after that would be saved again
+
+Archived months stay attached to their tables, so pages like show_member_workout
+read them the same way as recent months; they're just slower to reach.
+"""
+import argparse
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+
+PARTITIONED_TABLES = ('workouts', 'workout_exercises')
+
+# monthly partitions are named like workouts_p2023_05
+PARTITION_NAME = re.compile(r'^(?P<parent>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+def add_months(day, months):
+    """Return the first day of the month `months` months after day's month"""
+
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def ensure_partitions(connection, months_ahead):
+    """Create any missing monthly partitions from this month through months_ahead months from now"""
+
+    today = date.today()
+    connection.execute(text("SELECT ensure_workout_partitions(:first_month, :last_month)"),
+                       first_month=add_months(today, 0), last_month=add_months(today, months_ahead))
+
+
+def monthly_partitions(connection):
+    """Return (partition name, first day of its month, tablespace or None) for every monthly partition"""
+
+    rows = connection.execute(text("""
+        SELECT child.relname, parent.relname, tablespace.spcname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        LEFT JOIN pg_tablespace tablespace ON tablespace.oid = child.reltablespace
+        WHERE parent.relname = ANY(:parents)
+    """), parents=list(PARTITIONED_TABLES))
+
+    partitions = []
+    for name, parent, tablespace in rows:
+        match = PARTITION_NAME.match(name)
+
+        if match and match.group('parent') == parent:
+            partitions.append((name, date(int(match.group('year')),
+                                          int(match.group('month')), 1), tablespace))
+
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def archive_partitions(connection, tablespace, older_than):
+    """Move the partitions (and their indexes) of months older than older_than months to tablespace.
+
+    Each partition is moved and frozen on its own, so a long archive run only locks one month at a time."""
+
+    cutoff = add_months(date.today(), -older_than)
+    archived = []
+
+    for name, month, current_tablespace in monthly_partitions(connection):
+        if month >= cutoff or current_tablespace == tablespace:
+            continue
+
+        connection.execute(text(
+            f'ALTER TABLE "{name}" SET TABLESPACE "{tablespace}"'))
+
+        indexes = connection.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :name"), name=name)
+        for index_name, in indexes.fetchall():
+            connection.execute(text(
+                f'ALTER INDEX "{index_name}" SET TABLESPACE "{tablespace}"'))
+
+        # freeze the rows so autovacuum never has to rewrite the cold month again
+        connection.execute(text(f'VACUUM (FREEZE, ANALYZE) "{name}"'))
+
+        archived.append(name)
+
+    return archived
+
+
+def expire_submissions(connection, older_than_days):
+    """Delete the workout form idempotency keys recorded more than older_than_days days ago. Returns how many"""
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    result = connection.execute(text(
+        "DELETE FROM workout_submissions WHERE created_at < :cutoff"), cutoff=cutoff)
+
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from app import db
+
+    parser = argparse.ArgumentParser(
+        description="Maintain the monthly workout partitions")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ensure = commands.add_parser(
+        'ensure', help="create the partitions for the coming months")
+    ensure.add_argument('--months-ahead', type=int, default=12)
+
+    archive = commands.add_parser(
+        'archive', help="move old months to compressed storage")
+    archive.add_argument('--tablespace', required=True)
+    archive.add_argument('--older-than', type=int, default=12,
+                         help="archive months older than this many months (default 12)")
+
+    expire = commands.add_parser(
+        'expire-submissions', help="delete old add-to-workout form idempotency keys")
+    expire.add_argument('--older-than-days', type=int, default=7,
+                        help="delete keys older than this many days (default 7)")
+
+    args = parser.parse_args()
+
+    # VACUUM and per-partition moves can't run inside one big transaction
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if args.command == 'ensure':
+            ensure_partitions(connection, args.months_ahead)
+            print(f"monthly partitions exist through {args.months_ahead} months from now")
+
+        elif args.command == 'archive':
+            for name in archive_partitions(connection, args.tablespace, args.older_than):
+                print(f"archived {name} to {args.tablespace}")
+
+        else:
+            count = expire_submissions(connection, args.older_than_days)
+            print(f"deleted {count} form submissions older than {args.older_than_days} days")
@@ -0,0 +1,28 @@
+"""Writing files other processes read, for Capstone One Project"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Write path through a temporary file in the same directory that replaces it in a single step when the block
+    ends, so another process reading path gets the old file or the whole new one, never half of one. If the block
+    fails, the temporary file is removed and path is left as it was"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    file = tempfile.NamedTemporaryFile(mode=mode, dir=directory, prefix=f"{os.path.basename(path)}.",
+                                       suffix='.tmp', delete=False)
+
+    try:
+        with file:
+            yield file
+        os.replace(file.name, path)
+    except BaseException:
+        try:
+            os.remove(file.name)
+        except OSError:
+            pass
+        raise
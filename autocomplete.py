@@ -0,0 +1,150 @@
+"""Exercise name autocomplete for Capstone One Project
+
+An in-memory prefix index over Exercise.name: the lowercased name and each of
+its word suffixes ("dumbbell bench press", "bench press", "press") are kept in
+one sorted list, so a prefix lookup is a binary search. When nothing starts with
+what was typed, names within a small edit distance of it are offered instead,
+to allow for typos. New exercises are added as they're inserted.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from models import db, Exercise
+from watermark import IdWatermark
+
+
+def within_distance(a, b, max_distance):
+    """Return the edit distance between a and b (counting a swap of two neighbouring letters as one edit)
+    if it's at most max_distance, otherwise None"""
+
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    before_previous = None
+    previous = list(range(len(b) + 1))
+
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (a_char != b_char))
+
+            if i > 1 and j > 1 and a_char == b[j - 2] and a[i - 2] == b_char:
+                distance = min(distance, before_previous[j - 2] + 1)
+
+            current.append(distance)
+
+        # later rows can't get back under the limit once two rows in a row are over it
+        if min(current) > max_distance and min(previous) > max_distance:
+            return None
+        before_previous, previous = previous, current
+
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class ExerciseNameIndex:
+    """Sorted-array prefix index of exercise names, caught up from the exercises table"""
+
+    def __init__(self, refresh_interval=30, gap_timeout=300, max_gaps=10000):
+        self.refresh_interval = refresh_interval
+        # sorted (key, name) pairs; key is the lowercased name or one of its word suffixes
+        self.entries = []
+        self.names = set()
+        # exercises already indexed
+        self.watermark = IdWatermark(gap_timeout, max_gaps)
+        self.last_refreshed = 0
+        self.lock = threading.RLock()
+
+    def add(self, name):
+        """Index a new exercise name"""
+
+        with self.lock:
+            if name in self.names:
+                return
+            self.names.add(name)
+
+            words = name.lower().split()
+            for i in range(len(words)):
+                insort(self.entries, (' '.join(words[i:]), name))
+
+    def catch_up(self):
+        """Index the exercises committed since the last catch up, by this or any other worker, including ones
+        committed after an exercise with a higher id"""
+
+        with self.lock:
+            self.last_refreshed = time.time()
+
+            new_exercises = (db.session
+                             .query(Exercise.id, Exercise.name)
+                             .filter(self.watermark.unread(Exercise.id))
+                             .all())
+
+            for exercise_id, name in new_exercises:
+                self.add(name)
+
+            self.watermark.advance(
+                {exercise_id for exercise_id, name in new_exercises})
+
+    def refresh(self):
+        """Catch up if it has been longer than refresh_interval seconds"""
+
+        if time.time() - self.last_refreshed >= self.refresh_interval:
+            self.catch_up()
+
+    def complete(self, text, limit=10):
+        """Return up to limit exercise names matching what was typed, allowing for a typo or two if nothing matches exactly"""
+
+        prefix = ' '.join(text.lower().split())
+
+        if not prefix:
+            return []
+
+        matches = self.prefix_matches(prefix, limit)
+
+        if not matches and len(prefix) >= 3:
+            matches = self.fuzzy_matches(prefix, limit)
+
+        return matches
+
+    def prefix_matches(self, prefix, limit):
+        """Names with a word sequence starting with prefix, whole-name matches first"""
+
+        whole_name = []
+        word = []
+        i = bisect_left(self.entries, (prefix,))
+
+        while i < len(self.entries) and self.entries[i][0].startswith(prefix) and len(whole_name) < limit:
+            key, name = self.entries[i]
+            if key == ' '.join(name.lower().split()):
+                whole_name.append(name)
+            elif name not in word:
+                word.append(name)
+            i += 1
+
+        matches = whole_name + [name for name in word if name not in whole_name]
+
+        return matches[:limit]
+
+    def fuzzy_matches(self, prefix, limit):
+        """Names with a word sequence whose start is within a small edit distance of prefix"""
+
+        max_distance = 1 if len(prefix) <= 5 else 2
+        scored = {}
+
+        # typos are rarely in the first letter, so only keys sharing it are compared
+        start = bisect_left(self.entries, (prefix[0],))
+        end = bisect_left(self.entries, (chr(ord(prefix[0]) + 1),))
+
+        fragment = distance = None
+
+        for key, name in self.entries[start:end]:
+            # entries are sorted, so keys starting the same way are next to each other; compare each start once
+            if key[:len(prefix)] != fragment:
+                fragment = key[:len(prefix)]
+                distance = within_distance(prefix, fragment, max_distance)
+
+            if distance is not None and distance < scored.get(name, max_distance + 1):
+                scored[name] = distance
+
+        return sorted(scored, key=lambda name: (scored[name], name.lower()))[:limit]
@@ -0,0 +1,224 @@
+"""Shared read-only exercise catalog for Capstone One Project
+
+A compact, immutable snapshot of the exercises table that every gunicorn worker
+memory-maps read-only, so the operating system keeps a single copy of it in
+memory however many workers there are. Columns are stored as arrays: type,
+muscle, equipment and difficulty as small integer codes into string tables, and
+names and instructions as offsets into shared UTF-8 text blobs. Rows are sorted
+by name so a lookup is a binary search over the mapped file without loading it.
+
+Build (or rebuild) the snapshot from the database like:  python catalog.py
+A new snapshot replaces the old file in one step; running workers notice and
+switch to it on their next lookup.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from atomic_file import atomic_write
+
+
+MAGIC = b'EXCATLG1'
+
+# string columns stored as codes into a table of distinct values
+CODED_COLUMNS = ('type', 'muscle', 'equipment', 'difficulty')
+
+CatalogExercise = namedtuple(
+    'CatalogExercise', ['id', 'name', 'type', 'muscle', 'equipment', 'difficulty', 'instructions'])
+
+
+def write_catalog(path, exercises):
+    """Write a catalog snapshot of `exercises` (rows with the Exercise columns) to path, replacing any old snapshot in one step"""
+
+    # sort by the UTF-8 bytes of the name, the order the reader's binary search compares in
+    rows = sorted(exercises, key=lambda row: (
+        row.name.encode('utf-8'), row.id))
+
+    strings = {column: [] for column in CODED_COLUMNS}
+    codes = {column: {} for column in CODED_COLUMNS}
+    sections = {'ids': array('i'), 'name_offsets': array('I', [0]),
+                'instruction_offsets': array('I', [0])}
+    for column in CODED_COLUMNS:
+        sections[column] = array('H')
+    names = bytearray()
+    instructions = bytearray()
+
+    for row in rows:
+        sections['ids'].append(row.id)
+
+        names += row.name.encode('utf-8')
+        sections['name_offsets'].append(len(names))
+
+        instructions += (row.instructions or '').encode('utf-8')
+        sections['instruction_offsets'].append(len(instructions))
+
+        for column in CODED_COLUMNS:
+            value = getattr(row, column) or ''
+            if value not in codes[column]:
+                codes[column][value] = len(strings[column])
+                strings[column].append(value)
+            sections[column].append(codes[column][value])
+
+    blobs = [(name, section.tobytes()) for name, section in sections.items()]
+    blobs += [('names', bytes(names)), ('instructions', bytes(instructions))]
+
+    # lay the sections out after the header, each starting on an 8 byte boundary
+    header = {'count': len(rows), 'strings': strings, 'sections': {}}
+    offset = 0
+    for name, blob in blobs:
+        header['sections'][name] = [offset, len(blob)]
+        offset += len(blob) + (-len(blob) % 8)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(MAGIC) + 4 + len(header_bytes)) % 8)
+
+    with atomic_write(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(header_bytes)))
+        file.write(header_bytes)
+        for name, blob in blobs:
+            file.write(blob)
+            file.write(b'\0' * (-len(blob) % 8))
+
+    return len(rows)
+
+
+class Catalog:
+    """One memory-mapped catalog snapshot; lookups read straight from the mapping"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.mapping = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an exercise catalog")
+
+        header_length, = struct.unpack_from('<I', self.mapping, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(
+            self.mapping[header_start:header_start + header_length].decode('utf-8'))
+        data_start = header_start + header_length
+
+        self.count = header['count']
+        self.strings = header['strings']
+
+        view = memoryview(self.mapping)
+        sections = {}
+        for name, (offset, length) in header['sections'].items():
+            sections[name] = view[data_start +
+                                  offset:data_start + offset + length]
+
+        self.ids = sections['ids'].cast('i')
+        self.name_offsets = sections['name_offsets'].cast('I')
+        self.instruction_offsets = sections['instruction_offsets'].cast('I')
+        self.codes = {column: sections[column].cast('H')
+                      for column in CODED_COLUMNS}
+        self.names = sections['names']
+        self.instructions = sections['instructions']
+
+    def __len__(self):
+        return self.count
+
+    def name_bytes(self, index):
+        return self.names[self.name_offsets[index]:self.name_offsets[index + 1]]
+
+    def record(self, index):
+        """Return the exercise at position index as a CatalogExercise"""
+
+        instructions = self.instructions[self.instruction_offsets[index]:
+                                         self.instruction_offsets[index + 1]]
+
+        return CatalogExercise(
+            id=self.ids[index],
+            name=str(self.name_bytes(index), 'utf-8'),
+            instructions=str(instructions, 'utf-8'),
+            **{column: self.strings[column][self.codes[column][index]] for column in CODED_COLUMNS})
+
+    def find(self, name):
+        """Return the exercise named exactly `name` (the lowest id if there are several), or None"""
+
+        target = name.encode('utf-8')
+        low, high = 0, self.count
+
+        # binary search for the first row whose name isn't less than target
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_bytes(middle).tobytes() < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.count and self.name_bytes(low) == target:
+            return self.record(low)
+
+        return None
+
+
+class SharedCatalog:
+    """The current catalog snapshot at path, switching to a newer snapshot when the file is replaced"""
+
+    def __init__(self, path, check_interval=10):
+        self.path = path
+        self.check_interval = check_interval
+        self.catalog = None
+        self.file_id = None
+        self.last_checked = 0
+        self.lock = threading.Lock()
+
+    def current(self):
+        """Return the newest Catalog, or None if no snapshot has been built"""
+
+        if time.time() - self.last_checked >= self.check_interval:
+            with self.lock:
+                self.last_checked = time.time()
+
+                try:
+                    stat = os.stat(self.path)
+                except OSError:
+                    return self.catalog
+
+                file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+                if file_id != self.file_id:
+                    # the old Catalog is unmapped once no request is using it any more
+                    self.catalog = Catalog(self.path)
+                    self.file_id = file_id
+
+        return self.catalog
+
+    def find(self, name):
+        """Return the exercise named exactly `name` from the current snapshot, or None"""
+
+        catalog = self.current()
+
+        if catalog is None:
+            return None
+
+        return catalog.find(name)
+
+
+def build_catalog(path):
+    """Write a catalog snapshot of every exercise in the database to path"""
+
+    from models import db, Exercise
+
+    exercises = (db.session
+                 .query(Exercise.id, Exercise.name, Exercise.type, Exercise.muscle,
+                        Exercise.equipment, Exercise.difficulty, Exercise.instructions)
+                 .yield_per(1000))
+
+    return write_catalog(path, exercises)
+
+
+if __name__ == "__main__":
+    from app import app
+
+    path = app.config["EXERCISE_CATALOG"]
+    count = build_catalog(path)
+    print(f"wrote {count} exercises to {path}")
@@ -0,0 +1,186 @@
+"""Response compression for Capstone One Project
+
+Compresses the HTML rendered from the Jinja templates (gzip, or brotli when the
+'brotli' package is installed) and serves precompressed '.gz'/'.br' siblings of
+the files under 'static/' when a browser accepts them.
+
+Build the precompressed static files like:  python compression.py
+"""
+import gzip
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import request, send_from_directory
+
+
+DEFAULT_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+    'image/x-icon',
+    'image/vnd.microsoft.icon',
+}
+
+# file extensions worth precompressing; images like .jpg are already compressed
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.html', '.json', '.svg', '.txt', '.ico')
+
+# extension of the precompressed sibling file for each content-coding, in order of preference
+ENCODING_EXTENSIONS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def init_compression(app):
+    """Register response compression and precompressed static file serving on the Flask app."""
+
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(
+        os.environ.get('COMPRESS_MIN_SIZE', 500)))
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+
+    @app.before_request
+    def serve_precompressed_static():
+        """If a browser asks for a static file that has a precompressed sibling it accepts, send the sibling instead"""
+
+        static_prefix = app.static_url_path + '/'
+
+        if not request.path.startswith(static_prefix):
+            return None
+
+        filename = request.path[len(static_prefix):]
+        original = os.path.join(app.static_folder, filename)
+
+        if not os.path.isfile(original):
+            return None
+
+        for encoding, extension in ENCODING_EXTENSIONS:
+            compressed = original + extension
+
+            # only use a sibling that was built from the current version of the original file
+            if (accepts_encoding(encoding) and os.path.isfile(compressed)
+                    and os.path.getmtime(compressed) >= os.path.getmtime(original)):
+
+                response = send_from_directory(
+                    app.static_folder, filename + extension,
+                    mimetype=mimetypes.guess_type(original)[0] or 'application/octet-stream')
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+
+        return None
+
+    @app.after_request
+    def compress_response(response):
+        """Compress an eligible response with the best content-coding the browser accepts"""
+
+        if not should_compress(app, response):
+            return response
+
+        encoding = choose_encoding()
+
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+
+        if encoding == 'br':
+            compressed = brotli.compress(
+                data, quality=app.config['COMPRESS_BR_QUALITY'])
+        else:
+            compressed = gzip.compress(
+                data, compresslevel=app.config['COMPRESS_GZIP_LEVEL'])
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+
+        return response
+
+
+def should_compress(app, response):
+    """Is this response worth compressing: a complete, successful, uncompressed response of an allowed type and size"""
+
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return False
+
+    if 'Content-Encoding' in response.headers:
+        return False
+
+    if response.mimetype not in app.config['COMPRESS_MIMETYPES']:
+        return False
+
+    return (response.content_length or 0) >= app.config['COMPRESS_MIN_SIZE']
+
+
+def accepts_encoding(encoding):
+    """Does the current request's Accept-Encoding header allow this content-coding"""
+
+    if encoding == 'br' and brotli is None:
+        return False
+
+    return request.accept_encodings[encoding] > 0
+
+
+def choose_encoding():
+    """Return the preferred content-coding the browser accepts, or None"""
+
+    for encoding, extension in ENCODING_EXTENSIONS:
+        if accepts_encoding(encoding):
+            return encoding
+
+    return None
+
+
+def precompress_static(static_folder, min_size=500):
+    """Write '.gz' (and '.br' if brotli is installed) siblings for the compressible files under static_folder.
+
+    Siblings that are already newer than their original are left alone. Returns a list of the files written."""
+
+    written = []
+
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+
+            original = os.path.join(directory, filename)
+
+            with open(original, 'rb') as file:
+                data = file.read()
+
+            if len(data) < min_size:
+                continue
+
+            # mtime=0 so rebuilding an unchanged file gives byte-for-byte the same .gz
+            outputs = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+
+            if brotli is not None:
+                outputs.append(('.br', lambda: brotli.compress(data, quality=11)))
+
+            for extension, compress in outputs:
+                compressed = original + extension
+
+                if os.path.isfile(compressed) and os.path.getmtime(compressed) >= os.path.getmtime(original):
+                    continue
+
+                with open(compressed, 'wb') as file:
+                    file.write(compress())
+                written.append(compressed)
+
+    return written
+
+
+if __name__ == "__main__":
+    static_folder = os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), 'static')
+
+    for path in precompress_static(static_folder):
+        print(f"wrote {path}")
@@ -0,0 +1,228 @@
+"""API Ninjas exercises client for Capstone One Project
+
+Identical lookups are coalesced ("single flight"): while one request for a query
+is on its way to the API, other callers asking for the same query wait for it
+and share its result instead of sending their own. Within a worker process
+callers wait on the in-flight call; across gunicorn worker processes a lock on
+the query lets one process fetch while the others wait and then read the result
+it saved. Each query locks its own byte of a single lock file, so only lookups of
+the same query wait on each other, and results are saved in a fixed number of
+files (buckets), so the lock directory stays the same size however many different
+queries there are. Requests to the API go through one pooled session per process, so
+lookups reuse kept-alive connections.
+"""
+import atexit
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from atomic_file import atomic_write
+
+try:
+    import fcntl
+except ImportError:
+    # no cross-process locking on Windows; the development server is a single process anyway
+    fcntl = None
+
+
+API_URL = 'https://api.api-ninjas.com/v1/exercises'
+API_KEY = os.environ.get(
+    'API_NINJAS_KEY', '9NXRdadudV9r0D3QNO516BKZ8VeFXZD3Nq15zrRv')
+API_TIMEOUT = float(os.environ.get('API_TIMEOUT', 10))
+# kept-alive connections to the API per worker process; requests beyond it open (and then close) extra ones
+API_POOL_SIZE = int(os.environ.get('API_POOL_SIZE', 20))
+
+
+def normalize_query(params):
+    """Return the single-flight key for an API query: parameters sorted, values lowercased with whitespace collapsed"""
+
+    return urlencode(sorted((key, ' '.join(str(value).lower().split()))
+                            for key, value in params.items()))
+
+
+class Call:
+    """One in-flight fetch that other callers in the process can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one fetch per key at a time, sharing its result with every caller that asked meanwhile"""
+
+    def __init__(self, lock_dir=None, share_seconds=10, lock_timeout=None, slots=2 ** 20, buckets=256):
+        self.lock_dir = lock_dir or os.path.join(
+            tempfile.gettempdir(), 'exercise_api_single_flight')
+        # each query locks one of `slots` bytes of the lock file; queries in the same bucket share a saved result file
+        self.slots = slots
+        self.buckets = buckets
+        # how long a result saved by another process still counts as the answer to a query that was waiting on it
+        self.share_seconds = share_seconds
+        self.lock_timeout = lock_timeout if lock_timeout is not None else API_TIMEOUT + 5
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.lock_file = None
+        self.lock_file_pid = None
+
+    def do(self, key, fetch):
+        """Return fetch()'s result for `key`, joining a fetch already in flight for it if there is one"""
+
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+
+            if is_leader:
+                call = Call()
+                self.calls[key] = call
+
+        if not is_leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self.fetch_across_processes(key, fetch)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result
+
+    def fetch_across_processes(self, key, fetch):
+        """Hold the key's lock while fetching, so a process that waited on it can reuse the saved result"""
+
+        if fcntl is None:
+            return fetch()
+
+        lock_file = self.open_lock_file()
+        key_hash = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16)
+        slot = key_hash % self.slots
+        result_path = os.path.join(self.lock_dir, f"{key_hash % self.buckets}.json")
+
+        if not self.acquire(lock_file, slot):
+            # the process holding the lock is stuck; don't make this request wait on it any longer
+            return fetch()
+
+        try:
+            saved = self.read_saved_result(result_path, key)
+            if saved is not None:
+                return saved
+
+            result = fetch()
+
+            # only successful lookups are shared; a failure is retried by the next caller
+            if result is not None:
+                self.save_result(result_path, key, result)
+
+            return result
+        finally:
+            fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def open_lock_file(self):
+        """Return this process's handle on the lock file. It's opened once per process and only closed when the
+        process exits, because closing any handle on a file releases every lock the process holds on it"""
+
+        with self.lock:
+            if self.lock_file is None or self.lock_file_pid != os.getpid():
+                os.makedirs(self.lock_dir, exist_ok=True)
+                self.lock_file = open(os.path.join(
+                    self.lock_dir, 'single_flight.lock'), 'a')
+                self.lock_file_pid = os.getpid()
+                atexit.register(self.lock_file.close)
+
+            return self.lock_file
+
+    def acquire(self, lock_file, slot):
+        """Take the exclusive lock on the slot's byte, polling so a waiting request only sleeps (and doesn't block a
+        cooperative worker). These locks belong to the process, so they only keep other processes waiting; callers in
+        this process asking for the same key already wait on its in-flight call"""
+
+        deadline = time.time() + self.lock_timeout
+
+        while True:
+            try:
+                fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                return True
+            except OSError as error:
+                if error.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                if time.time() >= deadline:
+                    return False
+                time.sleep(0.02)
+
+    def read_saved_result(self, result_path, key):
+        """Return the result another process saved for this key within share_seconds, or None (also when the
+        bucket's result has since been replaced by one for another key)"""
+
+        try:
+            if time.time() - os.path.getmtime(result_path) > self.share_seconds:
+                return None
+
+            with open(result_path) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        return saved['result'] if saved.get('key') == key else None
+
+    def save_result(self, result_path, key, result):
+        """Save a result for processes waiting on the same key, replacing the bucket's old one in a single step"""
+
+        with atomic_write(result_path) as file:
+            json.dump({'key': key, 'result': result}, file)
+
+
+single_flight = SingleFlight(share_seconds=float(
+    os.environ.get('API_SHARE_SECONDS', 10)))
+
+
+def make_session(pool_size=API_POOL_SIZE):
+    """Return a requests Session that reuses its connections to the API instead of a new TLS handshake per lookup"""
+
+    session = requests.Session()
+    session.headers['X-Api-Key'] = API_KEY
+    session.mount('https://', HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size))
+
+    return session
+
+
+# shared by every thread (or greenlet, with gevent workers) of the process
+api_session = make_session()
+
+
+def request_exercises(params):
+    """Send one request to the API. Returns the list of exercises, or None if the request failed"""
+
+    try:
+        response = api_session.get(API_URL, params=params, timeout=API_TIMEOUT)
+    except requests.RequestException:
+        return None
+
+    if response.status_code != requests.codes.ok:
+        return None
+
+    return response.json()
+
+
+def fetch_exercises(**params):
+    """Look up exercises matching params (e.g. type='cardio' or name='jumping rope'), sharing the request with
+    any identical lookup already in flight. Returns the list of exercises, or None if the lookup failed"""
+
+    return single_flight.do(normalize_query(params), lambda: request_exercises(params))
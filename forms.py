@@ -45,3 +45,10 @@ class MemberEditForm(FlaskForm):
     image_url = StringField('(Optional) Image URL')
     bio = TextAreaField('(Optional) Tell us about yourself')
     password = PasswordField("Password", validators=[Length(min=6)])
+
+
+class WorkoutTemplateForm(FlaskForm):
+    """Form for saving a workout as a named template"""
+
+    name = StringField('Template Name', validators=[
+                       DataRequired(), Length(max=100)])
@@ -0,0 +1,48 @@
+"""gunicorn settings for Capstone One Project
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Most of a page view is spent waiting on the exercise API, so by default each
+worker process runs gevent: every request is a greenlet, and while one waits on
+the API (or on Postgres, through psycogreen) the worker's other requests keep
+running. One worker then serves hundreds of requests at once during upstream
+slowness, with its database connections capped by the app's SQLALCHEMY_POOL_SIZE
+and SQLALCHEMY_MAX_OVERFLOW. Set WORKER_CLASS=sync for one request per worker
+at a time.
+"""
+import multiprocessing
+import os
+
+
+worker_class = os.environ.get('WORKER_CLASS', 'gevent')
+
+# gevent workers each handle many requests, so one per CPU is enough; sync workers need more
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()
+                             if worker_class == 'gevent' else multiprocessing.cpu_count() * 2 + 1))
+
+# requests a gevent worker serves at once
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 500))
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# the app connects to the database when it's imported, so each worker imports it after forking
+# (and after gevent has patched the standard library) rather than sharing the master's connections
+preload_app = False
+
+
+def post_fork(server, worker):
+    """Make psycopg2 wait for Postgres by yielding to other greenlets instead of blocking the whole worker"""
+
+    # go by the worker that's running (gevent or gevent_pywsgi): -k on the command line overrides worker_class above
+    if type(worker).__module__ == 'gunicorn.workers.ggevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    """Load every template before the worker takes requests, from the bytecode cache filled by templating.py"""
+
+    from app import app
+    from templating import compile_templates
+
+    compile_templates(app)
@@ -0,0 +1,46 @@
+-- The schema db.create_all() made before the numbered migrations: the starting point
+-- they upgrade. A new Postgres database gets the production schema (partitioned
+-- workouts, composite foreign keys...) by running this and then every later file in
+-- migrations/ in order. The app only runs db.create_all() on a database with no
+-- tables, which gets unpartitioned tables; use that for development only.
+--
+-- run like:  for file in migrations/*.sql; do psql -v ON_ERROR_STOP=1 exercise_db -f "$file"; done
+
+BEGIN;
+
+CREATE TABLE exercises (
+    id serial PRIMARY KEY,
+    name varchar(140) NOT NULL,
+    type text NOT NULL,
+    muscle text NOT NULL,
+    equipment text NOT NULL,
+    difficulty text NOT NULL,
+    instructions text NOT NULL
+);
+
+CREATE TABLE members (
+    id serial PRIMARY KEY,
+    username text NOT NULL UNIQUE,
+    first_name text NOT NULL,
+    last_name text NOT NULL,
+    email text NOT NULL UNIQUE,
+    image_url text NOT NULL,
+    bio text,
+    location text,
+    password text NOT NULL
+);
+
+CREATE TABLE workouts (
+    id serial PRIMARY KEY,
+    member_id integer REFERENCES members (id),
+    workout_date date NOT NULL
+);
+
+CREATE TABLE workout_exercises (
+    id serial PRIMARY KEY,
+    workout_id integer NOT NULL REFERENCES workouts (id),
+    exercise_id integer NOT NULL REFERENCES exercises (id),
+    workout_date date NOT NULL
+);
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Workout templates: a member's named, reusable lists of exercises to start a
+-- workout from (WorkoutTemplate and WorkoutTemplateExercise in models.py).
+--
+-- run like:  psql exercise_db -f migrations/028_workout_templates.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS workout_templates (
+    id serial PRIMARY KEY,
+    member_id integer NOT NULL REFERENCES members (id),
+    name text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workout_template_exercises (
+    id serial PRIMARY KEY,
+    template_id integer NOT NULL REFERENCES workout_templates (id),
+    exercise_id integer NOT NULL REFERENCES exercises (id)
+);
+
+COMMIT;
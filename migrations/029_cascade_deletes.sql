@@ -0,0 +1,41 @@
+-- Let the database delete a member's workouts, workout_exercises rows and templates
+-- (ON DELETE CASCADE) so deleting a member is one DELETE statement. Exercises are
+-- shared catalog rows and are never deleted along with a workout.
+-- The template tables come from 028_workout_templates.sql, which runs first.
+--
+-- run like:  psql exercise_db -f migrations/029_cascade_deletes.sql
+
+BEGIN;
+
+-- workouts left behind by members deleted before this migration
+DELETE FROM workout_exercises
+WHERE workout_id IN (SELECT id FROM workouts WHERE member_id IS NULL);
+DELETE FROM workouts WHERE member_id IS NULL;
+
+ALTER TABLE workouts
+    DROP CONSTRAINT IF EXISTS workouts_member_id_fkey,
+    ADD CONSTRAINT workouts_member_id_fkey
+        FOREIGN KEY (member_id) REFERENCES members (id) ON DELETE CASCADE;
+
+ALTER TABLE workout_exercises
+    DROP CONSTRAINT IF EXISTS workout_exercises_workout_id_fkey,
+    ADD CONSTRAINT workout_exercises_workout_id_fkey
+        FOREIGN KEY (workout_id) REFERENCES workouts (id) ON DELETE CASCADE;
+
+ALTER TABLE workout_templates
+    DROP CONSTRAINT IF EXISTS workout_templates_member_id_fkey,
+    ADD CONSTRAINT workout_templates_member_id_fkey
+        FOREIGN KEY (member_id) REFERENCES members (id) ON DELETE CASCADE;
+
+ALTER TABLE workout_template_exercises
+    DROP CONSTRAINT IF EXISTS workout_template_exercises_template_id_fkey,
+    ADD CONSTRAINT workout_template_exercises_template_id_fkey
+        FOREIGN KEY (template_id) REFERENCES workout_templates (id) ON DELETE CASCADE;
+
+-- Postgres doesn't index foreign key columns by itself; without these each cascade is a full table scan
+CREATE INDEX IF NOT EXISTS ix_workouts_member_id ON workouts (member_id);
+CREATE INDEX IF NOT EXISTS ix_workout_exercises_workout_id ON workout_exercises (workout_id);
+CREATE INDEX IF NOT EXISTS ix_workout_templates_member_id ON workout_templates (member_id);
+CREATE INDEX IF NOT EXISTS ix_workout_template_exercises_template_id ON workout_template_exercises (template_id);
+
+COMMIT;
@@ -0,0 +1,144 @@
+-- Partition workouts and workout_exercises by month of workout_date (native Postgres
+-- range partitioning, Postgres 12 or newer). Queries that filter on workout_date only
+-- touch the months they need, and each month's indexes stay small. Old months can be
+-- moved to compressed storage with archive_workouts.py and are still read as usual.
+--
+-- run like:  psql exercise_db -f migrations/034_partition_workouts.sql
+
+BEGIN;
+
+-- create the monthly partitions of both tables from first_month through last_month.
+-- A month's rows that landed in the DEFAULT partitions first (ensure didn't run in time,
+-- or the date was further ahead) are moved into its new partitions: a partition can't be
+-- created while the DEFAULT partition holds rows in its range. The DEFAULT partition of
+-- workouts can't be detached while other tables reference its rows, so the rows are
+-- taken out and put back, with the rows of every table referencing them (ids unchanged)
+CREATE OR REPLACE FUNCTION ensure_workout_partitions(first_month date, last_month date)
+RETURNS void AS $function$
+DECLARE
+    month date := date_trunc('month', first_month)::date;
+    next_month date;
+    parent text;
+    partition text;
+    moved integer;
+    reference record;
+    -- foreign keys referencing workouts (workout_exercises, exercise_sets, timeline_entries...)
+    references_sql text := $sql$
+        SELECT constraint_.oid, constraint_.conrelid::regclass AS referencing,
+            (SELECT string_agg(quote_ident(attname), ', ' ORDER BY position)
+             FROM unnest(constraint_.conkey) WITH ORDINALITY AS key (attnum, position)
+             JOIN pg_attribute ON attrelid = constraint_.conrelid AND pg_attribute.attnum = key.attnum) AS columns,
+            (SELECT string_agg(quote_ident(attname), ', ' ORDER BY position)
+             FROM unnest(constraint_.confkey) WITH ORDINALITY AS key (attnum, position)
+             JOIN pg_attribute ON attrelid = constraint_.confrelid AND pg_attribute.attnum = key.attnum) AS referenced_columns
+        FROM pg_constraint constraint_
+        WHERE constraint_.contype = 'f' AND constraint_.confrelid = 'workouts'::regclass AND constraint_.conparentid = 0
+    $sql$;
+BEGIN
+    WHILE month <= last_month LOOP
+        next_month := (month + interval '1 month')::date;
+
+        IF to_regclass(format('workouts_p%s', to_char(month, 'YYYY_MM'))) IS NULL
+                OR to_regclass(format('workout_exercises_p%s', to_char(month, 'YYYY_MM'))) IS NULL THEN
+            -- no new rows for the month can land in the DEFAULT partitions until its own partitions exist
+            LOCK TABLE workouts, workout_exercises IN SHARE ROW EXCLUSIVE MODE;
+
+            CREATE TEMPORARY TABLE moved_workouts AS
+            SELECT * FROM workouts_default WHERE workout_date >= month AND workout_date < next_month;
+            GET DIAGNOSTICS moved = ROW_COUNT;
+
+            IF moved > 0 THEN
+                FOR reference IN EXECUTE references_sql LOOP
+                    EXECUTE format('CREATE TEMPORARY TABLE %I AS SELECT * FROM %s WHERE (%s) IN (SELECT %s FROM moved_workouts)',
+                                   'moved_' || reference.oid, reference.referencing, reference.columns,
+                                   reference.referenced_columns);
+                END LOOP;
+
+                -- cascades to the referencing rows saved above
+                DELETE FROM workouts WHERE (id, workout_date) IN (SELECT id, workout_date FROM moved_workouts);
+            END IF;
+
+            FOREACH parent IN ARRAY ARRAY['workouts', 'workout_exercises'] LOOP
+                partition := format('%s_p%s', parent, to_char(month, 'YYYY_MM'));
+
+                IF to_regclass(partition) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                                   partition, parent, month, next_month);
+                END IF;
+            END LOOP;
+
+            IF moved > 0 THEN
+                INSERT INTO workouts SELECT * FROM moved_workouts;
+
+                FOR reference IN EXECUTE references_sql LOOP
+                    EXECUTE format('INSERT INTO %s SELECT * FROM %I', reference.referencing, 'moved_' || reference.oid);
+                    EXECUTE format('DROP TABLE %I', 'moved_' || reference.oid);
+                END LOOP;
+            END IF;
+
+            DROP TABLE moved_workouts;
+        END IF;
+
+        month := next_month;
+    END LOOP;
+END;
+$function$ LANGUAGE plpgsql;
+
+-- move the unpartitioned tables (and the names of their indexes) out of the way
+ALTER TABLE workout_exercises RENAME TO workout_exercises_unpartitioned;
+ALTER TABLE workout_exercises_unpartitioned RENAME CONSTRAINT workout_exercises_pkey TO workout_exercises_unpartitioned_pkey;
+ALTER INDEX IF EXISTS ix_workout_exercises_workout_id RENAME TO ix_workout_exercises_unpartitioned_workout_id;
+ALTER SEQUENCE workout_exercises_id_seq OWNED BY NONE;
+
+ALTER TABLE workouts RENAME TO workouts_unpartitioned;
+ALTER TABLE workouts_unpartitioned RENAME CONSTRAINT workouts_pkey TO workouts_unpartitioned_pkey;
+ALTER INDEX IF EXISTS ix_workouts_member_id RENAME TO ix_workouts_unpartitioned_member_id;
+ALTER SEQUENCE workouts_id_seq OWNED BY NONE;
+
+-- a partitioned table's primary key has to include the partition key
+CREATE TABLE workouts (
+    id integer NOT NULL DEFAULT nextval('workouts_id_seq'),
+    member_id integer REFERENCES members (id) ON DELETE CASCADE,
+    workout_date date NOT NULL,
+    PRIMARY KEY (id, workout_date)
+) PARTITION BY RANGE (workout_date);
+
+CREATE TABLE workout_exercises (
+    id integer NOT NULL DEFAULT nextval('workout_exercises_id_seq'),
+    workout_id integer NOT NULL,
+    exercise_id integer NOT NULL REFERENCES exercises (id),
+    workout_date date NOT NULL,
+    PRIMARY KEY (id, workout_date),
+    FOREIGN KEY (workout_id, workout_date) REFERENCES workouts (id, workout_date) ON DELETE CASCADE
+) PARTITION BY RANGE (workout_date);
+
+ALTER SEQUENCE workouts_id_seq OWNED BY workouts.id;
+ALTER SEQUENCE workout_exercises_id_seq OWNED BY workout_exercises.id;
+
+CREATE INDEX ix_workouts_member_id_workout_date ON workouts (member_id, workout_date);
+CREATE INDEX ix_workout_exercises_workout_id ON workout_exercises (workout_id);
+
+-- rows dated outside every monthly partition land here instead of failing to insert
+CREATE TABLE workouts_default PARTITION OF workouts DEFAULT;
+CREATE TABLE workout_exercises_default PARTITION OF workout_exercises DEFAULT;
+
+SELECT ensure_workout_partitions(
+    COALESCE((SELECT MIN(workout_date) FROM workouts_unpartitioned), CURRENT_DATE),
+    (CURRENT_DATE + interval '12 months')::date);
+
+INSERT INTO workouts (id, member_id, workout_date)
+SELECT id, member_id, workout_date FROM workouts_unpartitioned;
+
+-- a workout_exercises row is filed under its workout's date (older rows may carry a different one)
+INSERT INTO workout_exercises (id, workout_id, exercise_id, workout_date)
+SELECT we.id, we.workout_id, we.exercise_id, w.workout_date
+FROM workout_exercises_unpartitioned we
+JOIN workouts_unpartitioned w ON w.id = we.workout_id;
+
+DROP TABLE workout_exercises_unpartitioned;
+DROP TABLE workouts_unpartitioned;
+
+COMMIT;
+
+ANALYZE workouts;
+ANALYZE workout_exercises;
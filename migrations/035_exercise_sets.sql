@@ -0,0 +1,31 @@
+-- Logged sets: reps, weight, duration and RPE of each set of an exercise in a workout.
+-- A set carries its workout's date so it can reference the partitioned workouts table
+-- (see 034_partition_workouts.sql) and be deleted along with its workout.
+--
+-- run like:  psql exercise_db -f migrations/035_exercise_sets.sql
+
+BEGIN;
+
+CREATE TABLE exercise_sets (
+    id serial PRIMARY KEY,
+    member_id integer NOT NULL REFERENCES members (id) ON DELETE CASCADE,
+    workout_id integer NOT NULL,
+    exercise_id integer NOT NULL REFERENCES exercises (id),
+    workout_date date NOT NULL,
+    set_number integer NOT NULL,
+    reps integer CONSTRAINT ck_exercise_sets_reps CHECK (reps >= 0),
+    weight double precision CONSTRAINT ck_exercise_sets_weight CHECK (weight >= 0),
+    duration integer CONSTRAINT ck_exercise_sets_duration CHECK (duration >= 0),
+    rpe double precision CONSTRAINT ck_exercise_sets_rpe CHECK (rpe BETWEEN 1 AND 10),
+    CONSTRAINT uq_exercise_sets_workout_id_workout_date_exercise_id_set_number
+        UNIQUE (workout_id, workout_date, exercise_id, set_number),
+    FOREIGN KEY (workout_id, workout_date) REFERENCES workouts (id, workout_date) ON DELETE CASCADE
+);
+
+-- progression queries (personal records, estimated 1RM trends) read one member's sets of
+-- one exercise in date order straight off this index
+CREATE INDEX ix_exercise_sets_member_id_exercise_id_workout_date
+    ON exercise_sets (member_id, exercise_id, workout_date);
+CREATE INDEX ix_exercise_sets_workout_id ON exercise_sets (workout_id);
+
+COMMIT;
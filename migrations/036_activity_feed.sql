@@ -0,0 +1,31 @@
+-- Members following members, and each member's precomputed activity feed (fan-out on write):
+-- saving a workout copies it into every follower's timeline_entries, so a feed page is one
+-- range scan of (member_id, workout_date, id) instead of a join across followed members' workouts.
+--
+-- run like:  psql exercise_db -f migrations/036_activity_feed.sql
+
+BEGIN;
+
+CREATE TABLE follows (
+    member_being_followed_id integer REFERENCES members (id) ON DELETE CASCADE,
+    member_following_id integer REFERENCES members (id) ON DELETE CASCADE,
+    PRIMARY KEY (member_being_followed_id, member_following_id)
+);
+
+CREATE INDEX ix_follows_member_following_id ON follows (member_following_id);
+
+CREATE TABLE timeline_entries (
+    id serial PRIMARY KEY,
+    member_id integer NOT NULL REFERENCES members (id) ON DELETE CASCADE,
+    author_id integer NOT NULL REFERENCES members (id) ON DELETE CASCADE,
+    workout_id integer NOT NULL,
+    workout_date date NOT NULL,
+    exercise_names text NOT NULL,
+    FOREIGN KEY (workout_id, workout_date) REFERENCES workouts (id, workout_date) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_timeline_entries_member_id_workout_date_id ON timeline_entries (member_id, workout_date, id);
+CREATE INDEX ix_timeline_entries_author_id ON timeline_entries (author_id);
+CREATE INDEX ix_timeline_entries_workout_id ON timeline_entries (workout_id);
+
+COMMIT;
@@ -0,0 +1,73 @@
+-- One workout per member per day, each exercise in a workout once, and idempotency keys for the
+-- add-to-workout form. Today's workout is upserted against the unique (member_id, workout_date)
+-- index, and exercise links are inserted with ON CONFLICT DO NOTHING against the new unique
+-- constraint, so repeated or concurrent submissions add nothing.
+--
+-- workout_submissions gets a row per submitted form; delete old ones daily with:
+--   python archive_workouts.py expire-submissions --older-than-days 7
+--
+-- run like:  psql exercise_db -f migrations/039_dedup_workouts.sql
+
+BEGIN;
+
+-- merge a member's duplicate workouts of a day into the first one
+CREATE TEMPORARY TABLE duplicate_workouts ON COMMIT DROP AS
+SELECT w.id, w.workout_date, first.id AS keep_id
+FROM workouts w
+JOIN (
+    SELECT member_id, workout_date, MIN(id) AS id
+    FROM workouts
+    GROUP BY member_id, workout_date
+) first ON first.member_id = w.member_id AND first.workout_date = w.workout_date
+WHERE w.id <> first.id;
+
+UPDATE workout_exercises we SET workout_id = d.keep_id
+FROM duplicate_workouts d
+WHERE we.workout_id = d.id AND we.workout_date = d.workout_date;
+
+-- the merged sets are renumbered in the order they were logged, so set numbers stay unique
+ALTER TABLE exercise_sets DROP CONSTRAINT uq_exercise_sets_workout_id_workout_date_exercise_id_set_number;
+
+UPDATE exercise_sets s SET workout_id = d.keep_id
+FROM duplicate_workouts d
+WHERE s.workout_id = d.id AND s.workout_date = d.workout_date;
+
+UPDATE exercise_sets s SET set_number = numbered.set_number
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY workout_id, workout_date, exercise_id ORDER BY id) AS set_number
+    FROM exercise_sets
+    WHERE (workout_id, workout_date) IN (SELECT DISTINCT keep_id, workout_date FROM duplicate_workouts)
+) numbered
+WHERE s.id = numbered.id AND s.set_number <> numbered.set_number;
+
+ALTER TABLE exercise_sets ADD CONSTRAINT uq_exercise_sets_workout_id_workout_date_exercise_id_set_number
+    UNIQUE (workout_id, workout_date, exercise_id, set_number);
+
+-- the duplicates' feed entries go with them (ON DELETE CASCADE)
+DELETE FROM workouts w
+USING duplicate_workouts d
+WHERE w.id = d.id AND w.workout_date = d.workout_date;
+
+-- keep the first link of each exercise in a workout
+DELETE FROM workout_exercises we
+USING workout_exercises earlier
+WHERE earlier.workout_id = we.workout_id
+    AND earlier.exercise_id = we.exercise_id
+    AND earlier.workout_date = we.workout_date
+    AND earlier.id < we.id;
+
+DROP INDEX ix_workouts_member_id_workout_date;
+CREATE UNIQUE INDEX ix_workouts_member_id_workout_date ON workouts (member_id, workout_date);
+
+-- the unique constraint's index also serves lookups by workout_id
+DROP INDEX ix_workout_exercises_workout_id;
+ALTER TABLE workout_exercises ADD CONSTRAINT uq_workout_exercises_workout_id_exercise_id_workout_date
+    UNIQUE (workout_id, exercise_id, workout_date);
+
+CREATE TABLE workout_submissions (
+    key text PRIMARY KEY,
+    member_id integer NOT NULL REFERENCES members (id) ON DELETE CASCADE,
+    created_at timestamp NOT NULL DEFAULT now()
+);
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- Exercises are looked up by name (exercise_description, add_exercises_to_workout); without an
+-- index every lookup reads the whole catalog. CONCURRENTLY keeps the table writable while the
+-- index builds, so this file runs outside a transaction.
+--
+-- run like:  psql exercise_db -f migrations/040_exercise_name_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_exercises_name ON exercises (name);
@@ -6,6 +6,19 @@ bcrypt = Bcrypt()
 db = SQLAlchemy()
 
 
+class Follows(db.Model):
+    """Connection of a follower <-> followed_member."""
+
+    __tablename__ = 'follows'
+
+    member_being_followed_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete="CASCADE"), primary_key=True)
+
+    # follows are looked up by who's following too (unfollowing, backfilling a timeline)
+    member_following_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete="CASCADE"), primary_key=True, index=True)
+
+
 class Member(db.Model):
     """Member in the system."""
     __tablename__ = 'members'
@@ -20,11 +33,47 @@ class Member(db.Model):
     location = db.Column(db.Text)
     password = db.Column(db.Text, nullable=False)
 
-    workouts = db.relationship('Workout', backref='members')
+    # workouts and templates are deleted by the database's ON DELETE CASCADE foreign keys, so
+    # deleting a member doesn't load them first (passive_deletes)
+    workouts = db.relationship(
+        'Workout', backref='members', cascade='all,delete', passive_deletes=True)
+
+    templates = db.relationship(
+        'WorkoutTemplate', backref='member', cascade='all,delete-orphan', passive_deletes=True)
+
+    followers = db.relationship(
+        "Member",
+        secondary="follows",
+        primaryjoin=(Follows.member_being_followed_id == id),
+        secondaryjoin=(Follows.member_following_id == id),
+        passive_deletes=True
+    )
+
+    following = db.relationship(
+        "Member",
+        secondary="follows",
+        primaryjoin=(Follows.member_following_id == id),
+        secondaryjoin=(Follows.member_being_followed_id == id),
+        passive_deletes=True
+    )
 
     def __repr__(self):
         return f"<Member #{self.id}: {self.username}, {self.first_name}, {self.last_name}, {self.email}>"
 
+    def is_followed_by(self, other_member):
+        """Is this member followed by `other_member`?"""
+
+        found_member_list = [
+            member for member in self.followers if member == other_member]
+        return len(found_member_list) == 1
+
+    def is_following(self, other_member):
+        """Is this member following `other_member`?"""
+
+        found_member_list = [
+            member for member in self.following if member == other_member]
+        return len(found_member_list) == 1
+
     @classmethod
     def signup(cls, username, first_name, last_name, email, password, image_url, bio, location):
         """Sign up member. Hashes password and adds member to system."""
@@ -66,38 +115,120 @@ class Workout(db.Model):
     """An individual workout"""
 
     __tablename__ = 'workouts'
+    # in production this table is partitioned by month of workout_date (see migrations/034_partition_workouts.sql),
+    # so queries that also filter on workout_date only read the months they need. A member has one workout a day:
+    # the unique index is what today's workout is upserted against
+    __table_args__ = (db.Index('ix_workouts_member_id_workout_date',
+                               'member_id', 'workout_date', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True)
-    member_id = db.Column(db.Integer, db.ForeignKey('members.id'))
+    member_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'))
 
     workout_date = db.Column(db.Date, nullable=False,
                              default=datetime.now().strftime("%A %b %d %Y"))
 
     exercises = db.relationship(
-        "Exercise", secondary="workout_exercises", backref="workouts", cascade='all,delete')
+        "Exercise", secondary="workout_exercises", backref="workouts", passive_deletes=True)
 
 
 class WorkoutExercise(db.Model):
     """Mapping workout to exercises"""
 
     __tablename__ = 'workout_exercises'
+    # partitioned by workout_date like workouts, so workout_date must always be the workout's date. An exercise is
+    # in a workout once; inserts skip links that already exist (ON CONFLICT DO NOTHING)
+    __table_args__ = (db.UniqueConstraint('workout_id', 'exercise_id', 'workout_date',
+                                          name='uq_workout_exercises_workout_id_exercise_id_workout_date'),)
 
     id = db.Column(db.Integer, primary_key=True)
     workout_id = db.Column(db.Integer, db.ForeignKey(
-        'workouts.id'), nullable=False)
+        'workouts.id', ondelete='CASCADE'), nullable=False)
     exercise_id = db.Column(db.Integer, db.ForeignKey(
         'exercises.id'), nullable=False)
     workout_date = db.Column(db.Date, nullable=False,
                              default=datetime.now().strftime("%A %b %d %Y"))
 
 
+class WorkoutSubmission(db.Model):
+    """The idempotency key of a submitted add-to-workout form, so submitting the same form again does nothing"""
+
+    __tablename__ = 'workout_submissions'
+
+    key = db.Column(db.Text, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+
+
+class ExerciseSet(db.Model):
+    """One logged set of an exercise in a workout: reps and weight lifted, or time spent, and how hard it felt"""
+
+    __tablename__ = 'exercise_sets'
+    # progression queries read one member's sets of one exercise in date order, straight off this index
+    __table_args__ = (db.Index('ix_exercise_sets_member_id_exercise_id_workout_date',
+                               'member_id', 'exercise_id', 'workout_date'),
+                      db.UniqueConstraint('workout_id', 'workout_date', 'exercise_id', 'set_number',
+                                          name='uq_exercise_sets_workout_id_workout_date_exercise_id_set_number'),
+                      db.CheckConstraint('reps >= 0', name='ck_exercise_sets_reps'),
+                      db.CheckConstraint('weight >= 0', name='ck_exercise_sets_weight'),
+                      db.CheckConstraint('duration >= 0', name='ck_exercise_sets_duration'),
+                      db.CheckConstraint('rpe BETWEEN 1 AND 10', name='ck_exercise_sets_rpe'))
+
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'), nullable=False)
+    workout_id = db.Column(db.Integer, db.ForeignKey(
+        'workouts.id', ondelete='CASCADE'), nullable=False, index=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey(
+        'exercises.id'), nullable=False)
+    # the workout's date, like workout_exercises, so sets can be found by date without joining workouts
+    workout_date = db.Column(db.Date, nullable=False)
+    # 1 for the first set of the exercise in the workout, 2 for the next...
+    set_number = db.Column(db.Integer, nullable=False)
+    reps = db.Column(db.Integer)
+    weight = db.Column(db.Float)
+    # seconds
+    duration = db.Column(db.Integer)
+    # rate of perceived exertion, 1 (very easy) to 10 (all out)
+    rpe = db.Column(db.Float)
+
+    exercise = db.relationship("Exercise")
+
+
+class TimelineEntry(db.Model):
+    """A followed member's workout in one member's activity feed.
+
+    Written when the workout is saved (fan-out on write), with everything the feed shows copied in, so reading
+    a feed is a range scan of the (member_id, workout_date, id) index instead of a join across followed members' workouts"""
+
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (db.Index('ix_timeline_entries_member_id_workout_date_id', 'member_id', 'workout_date', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # whose feed the entry is in
+    member_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'), nullable=False)
+    # who did the workout
+    author_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'), nullable=False, index=True)
+    workout_id = db.Column(db.Integer, db.ForeignKey(
+        'workouts.id', ondelete='CASCADE'), nullable=False, index=True)
+    workout_date = db.Column(db.Date, nullable=False)
+    # the workout's exercise names, comma separated
+    exercise_names = db.Column(db.Text, nullable=False)
+
+    author = db.relationship("Member", foreign_keys=[author_id])
+
+
 class Exercise(db.Model):
     """An individual exercise"""
 
     __tablename__ = 'exercises'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(140), nullable=False)
+    name = db.Column(db.String(140), nullable=False, index=True)
     type = db.Column(db.Text, nullable=False)
     muscle = db.Column(db.Text, nullable=False)
     equipment = db.Column(db.Text, nullable=False)
@@ -105,6 +236,32 @@ class Exercise(db.Model):
     instructions = db.Column(db.Text, nullable=False)
 
 
+class WorkoutTemplate(db.Model):
+    """A named, reusable list of exercises a member can start a workout from"""
+
+    __tablename__ = 'workout_templates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey(
+        'members.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.Text, nullable=False)
+
+    exercises = db.relationship(
+        "Exercise", secondary="workout_template_exercises", passive_deletes=True)
+
+
+class WorkoutTemplateExercise(db.Model):
+    """Mapping workout templates to exercises"""
+
+    __tablename__ = 'workout_template_exercises'
+
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey(
+        'workout_templates.id', ondelete='CASCADE'), nullable=False, index=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey(
+        'exercises.id'), nullable=False)
+
+
 def connect_db(app):
     """Connect this database to provided Flask app.
     You should call this in your Flask app. """
@@ -0,0 +1,226 @@
+"""Request profiling and slow query logging for Capstone One Project
+
+Profiling is opt-in per request: a request is profiled when it sends an
+X-Profile header matching PROFILE_TOKEN, or at random for a PROFILE_SAMPLE_RATE
+share of requests. A profiled request is sampled every PROFILE_INTERVAL seconds
+and its stacks are written to PROFILE_DIR in the "folded" format read by
+flamegraph.pl and speedscope, so it shows whether the time went to the exercise
+API (requests), SQL (sqlalchemy) or rendering (jinja2). In a gevent worker the
+request's greenlet is sampled, including while it waits on the API or Postgres.
+
+Any SQL statement slower than SLOW_QUERY_MS is logged with the route that ran
+it and, on Postgres, its EXPLAIN plan.
+"""
+import hmac
+import importlib
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+
+def original(module, name):
+    """Return the standard library's own module.name, even in a gevent worker that has patched it"""
+
+    monkey = sys.modules.get('gevent.monkey')
+
+    if monkey is not None:
+        return monkey.get_original(module, name)
+
+    return getattr(importlib.import_module(module), name)
+
+
+def request_greenlet():
+    """Return the current request's greenlet in a gevent worker (where threading is patched), otherwise None"""
+
+    monkey = sys.modules.get('gevent.monkey')
+
+    if monkey is None or not monkey.is_module_patched('threading'):
+        return None
+
+    from greenlet import getcurrent
+    return getcurrent()
+
+
+class SamplingProfiler:
+    """Samples one thread's call stack, or in a gevent worker one greenlet's, from a background OS thread,
+    counting identical stacks"""
+
+    def __init__(self, thread_id, interval=0.005, greenlet=None):
+        # the OS thread running the request, and the request's greenlet if it shares that thread with others
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = False
+        # a real thread and lock even under gevent, so sampling goes on while the request's greenlet is busy
+        self.finished = original('_thread', 'allocate_lock')()
+        self.sleep = original('time', 'sleep')
+
+    def start(self):
+        self.started = time.time()
+        self.finished.acquire()
+        original('_thread', 'start_new_thread')(self.run, ())
+
+    def stop(self):
+        self.stopped = True
+        self.finished.acquire()
+        self.finished.release()
+        self.elapsed = time.time() - self.started
+
+    def run(self):
+        try:
+            while not self.stopped:
+                self.sleep(self.interval)
+                frame = self.current_frame()
+
+                if frame is not None:
+                    self.stacks[self.fold(frame)] += 1
+        finally:
+            self.finished.release()
+
+    def current_frame(self):
+        """The sampled request's innermost frame: where its greenlet is waiting if it's switched out, otherwise
+        whatever its thread is running"""
+
+        if self.greenlet is not None and self.greenlet.gr_frame is not None:
+            return self.greenlet.gr_frame
+
+        return sys._current_frames().get(self.thread_id)
+
+    @staticmethod
+    def fold(frame):
+        """Return a stack as 'outermost;...;innermost' frames, each 'function (file:line)'"""
+
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        return ';'.join(reversed(frames))
+
+    def write_folded(self, path):
+        """Write the samples as folded stacks: one 'stack count' line per distinct stack"""
+
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def init_profiling(app, engine):
+    """Register opt-in request profiling on the Flask app and slow query logging on the SQLAlchemy engine"""
+
+    app.config.setdefault('PROFILE_TOKEN', os.environ.get('PROFILE_TOKEN'))
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(
+        os.environ.get('PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_INTERVAL', float(
+        os.environ.get('PROFILE_INTERVAL', 0.005)))
+    app.config.setdefault('PROFILE_DIR', os.environ.get(
+        'PROFILE_DIR', os.path.join(app.instance_path, 'profiles')))
+    app.config.setdefault('SLOW_QUERY_MS', float(
+        os.environ.get('SLOW_QUERY_MS', 250)))
+
+    @app.before_request
+    def start_profiler():
+        """Start sampling this request if it asked to be profiled with the right token, or was picked at random"""
+
+        token = app.config['PROFILE_TOKEN']
+        header = request.headers.get('X-Profile')
+        requested = bool(token and header and hmac.compare_digest(
+            header.encode('utf-8'), token.encode('utf-8')))
+        sampled = random.random() < app.config['PROFILE_SAMPLE_RATE']
+
+        if requested or sampled:
+            g.profiler = SamplingProfiler(original('_thread', 'get_ident')(),
+                                          app.config['PROFILE_INTERVAL'], request_greenlet())
+            g.profiler.start()
+
+    @app.teardown_request
+    def write_profile(error=None):
+        """Stop sampling and write the profile, even if the request failed"""
+
+        profiler = g.pop('profiler', None)
+
+        if profiler is None:
+            return
+
+        profiler.stop()
+
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint}-{os.getpid()}-{threading.get_ident()}.folded"
+        path = os.path.join(app.config['PROFILE_DIR'], filename)
+        profiler.write_folded(path)
+
+        app.logger.info("profiled %s %s in %.1fms: %s", request.method,
+                        request.path, profiler.elapsed * 1000, path)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start_time'] = time.time()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        """Log a statement that took longer than SLOW_QUERY_MS, with the route that ran it and its plan"""
+
+        elapsed_ms = (time.time() - conn.info['query_start_time']) * 1000
+
+        if elapsed_ms < app.config['SLOW_QUERY_MS']:
+            return
+
+        route = request.endpoint if has_request_context() else None
+        plan = None
+
+        if conn.dialect.name == 'postgresql' and not executemany:
+            plan = explain(cursor, statement, parameters)
+
+        app.logger.warning("slow query %.1fms in %s: %s\nparameters: %r\nplan:\n%s",
+                           elapsed_ms, route, statement, parameters, plan or "(not available)")
+
+
+def explain(cursor, statement, parameters):
+    """Return the EXPLAIN plan of a statement, or None if it can't be explained. Never raises, so logging a slow
+    query can't make the query itself fail.
+
+    Runs on a new cursor of the same database connection so the slow query's own results aren't disturbed. In a
+    transaction it runs inside a savepoint, so a statement that can't be explained doesn't abort the request's
+    transaction; on an autocommit connection (e.g. archive_workouts.py) there's no transaction to protect."""
+
+    words = statement.split(None, 1)
+
+    if not words or words[0].upper() not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+        return None
+
+    try:
+        from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+
+        connection = cursor.connection
+        in_transaction = not connection.autocommit
+
+        # a failed transaction can't run anything more, and EXPLAIN mustn't start a transaction of its own
+        if in_transaction and connection.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            return None
+
+        with connection.cursor() as explain_cursor:
+            if in_transaction:
+                explain_cursor.execute("SAVEPOINT explain_slow_query")
+
+            try:
+                explain_cursor.execute("EXPLAIN " + statement, parameters)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+            except Exception:
+                if in_transaction:
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                return None
+
+            if in_transaction:
+                explain_cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+            return plan
+    except Exception:
+        return None
@@ -0,0 +1,85 @@
+"""Strength progression for Capstone One Project
+
+Personal records and estimated one-rep max (1RM) trends, computed from a
+member's logged sets (the exercise_sets table) with window functions. Both
+queries read one member's sets through the (member_id, exercise_id,
+workout_date) index, so they stay fast however many sets are logged.
+
+A set's estimated 1RM uses the Epley formula, weight * (1 + reps / 30); a single
+rep counts as its own weight.
+"""
+from sqlalchemy import text
+
+from models import db
+
+
+ESTIMATED_1RM = "CASE WHEN s.reps = 1 THEN s.weight ELSE s.weight * (1 + s.reps / 30.0) END"
+
+# for every exercise, the member's heaviest set and the set with the best estimated 1RM (earliest first on ties)
+PERSONAL_RECORDS_SQL = text(f"""
+    WITH ranked AS (
+        SELECT s.exercise_id, s.workout_id, s.workout_date, s.reps, s.weight,
+               {ESTIMATED_1RM} AS estimated_1rm,
+               ROW_NUMBER() OVER (PARTITION BY s.exercise_id
+                                  ORDER BY s.weight DESC, s.reps DESC, s.workout_date) AS weight_rank,
+               ROW_NUMBER() OVER (PARTITION BY s.exercise_id
+                                  ORDER BY {ESTIMATED_1RM} DESC, s.workout_date) AS estimated_1rm_rank
+        FROM exercise_sets s
+        WHERE s.member_id = :member_id AND s.reps > 0 AND s.weight > 0
+    )
+    SELECT r.exercise_id, e.name, r.workout_id, r.workout_date, r.reps, r.weight, r.estimated_1rm,
+           r.weight_rank, r.estimated_1rm_rank
+    FROM ranked r JOIN exercises e ON e.id = r.exercise_id
+    WHERE r.weight_rank = 1 OR r.estimated_1rm_rank = 1
+    ORDER BY e.name, r.exercise_id
+""")
+
+# the member's best estimated 1RM of an exercise on each workout date, with the best so far and
+# the average over the last five dates it was trained
+ESTIMATED_1RM_TREND_SQL = text(f"""
+    WITH daily AS (
+        SELECT s.workout_date, MAX({ESTIMATED_1RM}) AS estimated_1rm
+        FROM exercise_sets s
+        WHERE s.member_id = :member_id AND s.exercise_id = :exercise_id
+            AND s.workout_date >= :since AND s.reps > 0 AND s.weight > 0
+        GROUP BY s.workout_date
+    )
+    SELECT workout_date, estimated_1rm,
+           MAX(estimated_1rm) OVER (ORDER BY workout_date ROWS UNBOUNDED PRECEDING) AS best_so_far,
+           AVG(estimated_1rm) OVER (ORDER BY workout_date ROWS BETWEEN 4 PRECEDING AND CURRENT ROW) AS moving_average
+    FROM daily
+    ORDER BY workout_date
+""")
+
+
+def personal_records(member_id):
+    """Return the member's records for each exercise they've logged weighted sets of, by exercise name:
+    the heaviest set and the set with the best estimated 1RM"""
+
+    records = {}
+
+    for row in db.session.execute(PERSONAL_RECORDS_SQL, {'member_id': member_id}):
+        record = records.setdefault(row.exercise_id, {
+            'exercise_id': row.exercise_id, 'name': row.name})
+        logged_set = {'workout_id': row.workout_id, 'workout_date': str(row.workout_date),
+                      'reps': row.reps, 'weight': row.weight,
+                      'estimated_1rm': round(row.estimated_1rm, 1)}
+
+        if row.weight_rank == 1:
+            record['heaviest'] = logged_set
+        if row.estimated_1rm_rank == 1:
+            record['best_estimated_1rm'] = logged_set
+
+    return list(records.values())
+
+
+def estimated_1rm_trend(member_id, exercise_id, since):
+    """Return the member's estimated 1RM of an exercise for each date they trained it on or after since, oldest first"""
+
+    rows = db.session.execute(ESTIMATED_1RM_TREND_SQL, {
+        'member_id': member_id, 'exercise_id': exercise_id, 'since': since})
+
+    return [{'workout_date': str(row.workout_date),
+             'estimated_1rm': round(row.estimated_1rm, 1),
+             'best_so_far': round(row.best_so_far, 1),
+             'moving_average': round(row.moving_average, 1)} for row in rows]
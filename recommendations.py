@@ -0,0 +1,230 @@
+"""Exercise recommendations for Capstone One Project
+
+"Members who did X also did Y": counts how often two exercises were saved to the
+same workout (the workout_exercises table) and suggests the exercises that most
+often go with the ones a member is looking at. The counts are a sparse matrix
+kept in memory and caught up incrementally from new workout_exercises rows.
+
+Counting every workout is too slow to do while serving a request, so workers
+only ever load a snapshot saved to disk and never write one. Build it from the
+database, and rebuild it regularly so workers start with little to catch up, like:
+python recommendations.py
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import text
+
+from atomic_file import atomic_write
+from models import db, WorkoutExercise, Exercise
+from watermark import IdWatermark
+
+
+logger = logging.getLogger(__name__)
+
+# counts every pair of different exercise names saved to the same workout, each pair once (a.name < b.name)
+PAIR_COUNTS_SQL = text("""
+    WITH workout_names AS (
+        SELECT DISTINCT we.workout_id, e.name
+        FROM workout_exercises we JOIN exercises e ON e.id = we.exercise_id
+        WHERE we.id <= :watermark
+    )
+    SELECT a.name, b.name, COUNT(*)
+    FROM workout_names a JOIN workout_names b
+        ON a.workout_id = b.workout_id AND a.name < b.name
+    GROUP BY a.name, b.name
+""")
+
+
+class ExerciseRecommender:
+    """Sparse exercise co-occurrence counts, keyed by exercise name"""
+
+    def __init__(self, snapshot_path=None, refresh_interval=30, gap_timeout=300, max_gaps=10000):
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+
+        # counts[name][other_name] is the number of workouts that included both exercises
+        self.counts = defaultdict(dict)
+        # workout_exercises rows already counted
+        self.watermark = IdWatermark(gap_timeout, max_gaps)
+        self.loaded = False
+        self.warned = False
+        self.last_refreshed = 0
+        self.top_cache = {}
+        self.lock = threading.RLock()
+
+    def add_pair(self, name, other_name, count=1):
+        """Count `count` more workouts that included both exercises"""
+
+        self.counts[name][other_name] = self.counts[name].get(
+            other_name, 0) + count
+        self.counts[other_name][name] = self.counts[other_name].get(
+            name, 0) + count
+
+    def load(self):
+        """Load the saved snapshot. Returns False, leaving the counts empty, if there isn't one yet"""
+
+        with self.lock:
+            if not (self.snapshot_path and os.path.isfile(self.snapshot_path)):
+                if not self.warned:
+                    logger.warning("no recommendation snapshot at %s; build one with: python recommendations.py",
+                                   self.snapshot_path)
+                    self.warned = True
+                return False
+
+            with open(self.snapshot_path) as file:
+                snapshot = json.load(file)
+
+            self.counts = defaultdict(dict)
+            for name, other_name, count in snapshot['pairs']:
+                self.add_pair(name, other_name, count)
+            # gaps missed before the snapshot was saved get a full gap_timeout from now
+            self.watermark.reset(snapshot['watermark'], snapshot.get('gaps', []))
+
+            self.loaded = True
+            self.top_cache = {}
+
+            return True
+
+    def rebuild(self):
+        """Recount every workout in the database with a single grouped query. This reads all of workout_exercises,
+        so it's for building a snapshot offline (see the end of this file), not for a worker serving requests"""
+
+        # one consistent view of the table for the count and for the ids near the top of it
+        with db.engine.connect() as connection:
+            connection = connection.execution_options(
+                isolation_level='SERIALIZABLE')
+
+            with connection.begin():
+                watermark = connection.execute(
+                    db.select([db.func.max(WorkoutExercise.id)])).scalar() or 0
+
+                counts = list(connection.execute(
+                    PAIR_COUNTS_SQL, {'watermark': watermark}))
+
+                present = {row_id for row_id, in connection.execute(
+                    db.select([WorkoutExercise.id]).where(WorkoutExercise.id > watermark - self.watermark.max_gaps))}
+
+        with self.lock:
+            self.counts = defaultdict(dict)
+            for name, other_name, count in counts:
+                self.add_pair(name, other_name, count)
+
+            # rows still being written when the count ran are picked up by the next catch up
+            self.watermark.reset(watermark, [row_id for row_id in range(
+                max(watermark - self.watermark.max_gaps, 0) + 1, watermark) if row_id not in present])
+
+            self.loaded = True
+            self.top_cache = {}
+
+    def catch_up(self):
+        """Count the workout_exercises rows committed since the last catch up, by this or any other worker. Each
+        row is counted once, however late its transaction commits (within gap_timeout seconds)"""
+
+        with self.lock:
+            if not self.loaded and not self.load():
+                return
+
+            self.last_refreshed = time.time()
+
+            new_rows = (db.session
+                        .query(WorkoutExercise.id, WorkoutExercise.workout_id, Exercise.name)
+                        .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+                        .filter(self.watermark.unread(WorkoutExercise.id))
+                        .all())
+
+            if not new_rows:
+                return
+
+            new_ids = {row_id for row_id, workout_id, name in new_rows}
+            new_names = defaultdict(set)
+            for row_id, workout_id, name in new_rows:
+                new_names[workout_id].add(name)
+
+            # exercises those workouts already had, which were counted in earlier catch ups: not rows in the gaps
+            # or above the watermark that committed since the query above, which the next catch up counts
+            old_names = defaultdict(set)
+            for row_id, workout_id, name in (db.session
+                                             .query(WorkoutExercise.id, WorkoutExercise.workout_id, Exercise.name)
+                                             .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+                                             .filter(WorkoutExercise.workout_id.in_(new_names.keys()),
+                                                     WorkoutExercise.id <= self.watermark.value)):
+                if row_id not in new_ids and self.watermark.is_read(row_id):
+                    old_names[workout_id].add(name)
+
+            for workout_id, names in new_names.items():
+                names = sorted(names - old_names[workout_id])
+
+                # pair each newly added exercise with the ones already in the workout and with each other
+                for i, name in enumerate(names):
+                    for other_name in old_names[workout_id]:
+                        self.add_pair(name, other_name)
+                    for other_name in names[i + 1:]:
+                        self.add_pair(name, other_name)
+
+            self.watermark.advance(new_ids)
+            self.top_cache = {}
+
+    def refresh(self):
+        """Catch up if it has been longer than refresh_interval seconds, so other workers' workouts show up"""
+
+        if time.time() - self.last_refreshed >= self.refresh_interval:
+            self.catch_up()
+
+    def save(self):
+        """Write a snapshot of the counts to snapshot_path, replacing the old one in a single step"""
+
+        if not self.snapshot_path:
+            return
+
+        with self.lock:
+            pairs = [[name, other_name, count]
+                     for name, others in self.counts.items()
+                     for other_name, count in others.items()
+                     if name < other_name]
+            snapshot = {'watermark': self.watermark.value,
+                        'gaps': sorted(self.watermark.gaps), 'pairs': pairs}
+
+            with atomic_write(self.snapshot_path) as file:
+                json.dump(snapshot, file, separators=(',', ':'))
+
+    def top(self, name, k=5):
+        """Return up to k names of the exercises most often done in the same workout as `name`"""
+
+        key = (name, k)
+
+        with self.lock:
+            if key not in self.top_cache:
+                others = self.counts.get(name, {})
+                self.top_cache[key] = [other_name for other_name, count in heapq.nlargest(
+                    k, others.items(), key=lambda item: (item[1], item[0]))]
+
+            return self.top_cache[key]
+
+    def suggest_for(self, names, k=5):
+        """Return up to k names of the exercises most often done alongside all of `names`, leaving out `names` themselves"""
+
+        names = set(names)
+        scores = Counter()
+
+        with self.lock:
+            for name in names:
+                scores.update(self.counts.get(name, {}))
+
+        return [other_name for other_name, count in heapq.nlargest(
+            k + len(names), scores.items(), key=lambda item: (item[1], item[0]))
+            if other_name not in names][:k]
+
+
+if __name__ == "__main__":
+    from app import app
+
+    recommender = ExerciseRecommender(app.config["RECOMMENDATION_SNAPSHOT"])
+    recommender.rebuild()
+    recommender.save()
+    print(f"wrote {sum(map(len, recommender.counts.values())) // 2} exercise pairs to {recommender.snapshot_path}")
@@ -0,0 +1,336 @@
+"""Synthetic data for Capstone One Project
+
+Fills a Postgres database with a production-sized population, streamed in with
+COPY, and checks that the app's hot queries use indexes at that size.
+
+    python seed.py generate --members 1000000 --seed 42
+        a catalog of --exercises synthetic exercises, then --members members with about
+        --workouts-per-member workouts each over the last --days days, and about
+        --exercises-per-workout exercises per workout (the defaults make 1M members about
+        50M workout_exercises rows). The same --seed always generates the same rows.
+
+    python seed.py check-plans
+        EXPLAIN the queries behind show_member, add_exercises_to_workout and
+        exercise_description, and fail if any of them scans a whole big table
+
+Every generated member's password is "password". Rows are added after whatever
+is already in the database; use an empty database for reproducible ids.
+"""
+import argparse
+import bisect
+import csv
+import io
+import itertools
+import random
+import re
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+
+TYPES = ['cardio', 'olympic_weightlifting', 'plyometrics',
+         'powerlifting', 'strength', 'stretching', 'strongman']
+MUSCLES = ['abdominals', 'abductors', 'adductors', 'biceps', 'calves', 'chest', 'forearms', 'glutes',
+           'hamstrings', 'lats', 'lower_back', 'middle_back', 'neck', 'quadriceps', 'traps', 'triceps']
+DIFFICULTIES = ['beginner', 'intermediate', 'expert']
+EQUIPMENT = ['Barbell', 'Dumbbell', 'Kettlebell', 'Cable', 'Machine', 'Band', 'Body Weight',
+             'Medicine Ball', 'EZ-Bar', 'Smith Machine', 'Sandbag', 'Trap Bar']
+MOVEMENTS = ['Squat', 'Deadlift', 'Bench Press', 'Row', 'Curl', 'Overhead Press', 'Lunge', 'Pull-Up',
+             'Push-Up', 'Lateral Raise', 'Triceps Extension', 'Fly', 'Shrug', 'Crunch', 'Plank', 'Swing',
+             'Clean', 'Snatch', 'Box Jump', 'Sprint', 'Hamstring Stretch', 'Farmer Carry', 'Dip', 'Hip Thrust']
+VARIANTS = ['', 'Incline', 'Decline', 'Single-Arm', 'Wide-Grip', 'Close-Grip', 'Paused', 'Tempo', 'Seated',
+            'Standing', 'Reverse', 'Sumo', 'Front', 'Deficit', 'Alternating', 'Isometric']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Maria', 'Wei', 'Aisha', 'Diego', 'Priya', 'Kofi', 'Yuki', 'Olga', 'Omar', 'Lena']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Nguyen', 'Kowalski', 'Haddad', 'Silva', 'Patel',
+              'Johansson', 'Kim', 'Rossi', 'Novak', 'Mensah', 'Tanaka', 'Murphy', 'Cohen', 'Ivanova']
+LOCATIONS = ['New York', 'Chicago', 'Austin', 'Denver', 'Seattle', 'Atlanta', 'Boston', 'Portland', None]
+
+# the tables the check fails on if a hot query reads all of one (or all of a monthly partition of one)
+BIG_TABLES = ('members', 'workouts', 'workout_exercises', 'exercises')
+PARTITION_SUFFIX = re.compile(r'_(p\d{4}_\d{2}|default)$')
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+class CopyStream:
+    """A file-like object whose read() returns CSV lines of rows generated on demand, for cursor.copy_expert,
+    so a table of any size is loaded without holding it in memory"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.leftover = ''
+
+    def read(self, size=8192):
+        buffer = io.StringIO()
+        buffer.write(self.leftover)
+        writer = csv.writer(buffer, lineterminator='\n')
+
+        while buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            writer.writerow(row)
+
+        data = buffer.getvalue()
+        self.leftover = data[size:]
+
+        return data[:size]
+
+
+def exercise_rows(count, first_id, seed):
+    """(id, name, type, muscle, equipment, difficulty, instructions) of `count` exercises with distinct names"""
+
+    rng = random.Random(f"{seed}-exercises")
+    combinations = itertools.product(MOVEMENTS, EQUIPMENT, VARIANTS)
+
+    for i, (movement, equipment, variant) in enumerate(itertools.islice(combinations, count)):
+        name = ' '.join(filter(None, (variant, equipment, movement)))
+        yield (first_id + i, name, rng.choice(TYPES), rng.choice(MUSCLES), equipment.lower(), rng.choice(DIFFICULTIES),
+               f"Perform the {name.lower()} with control through the full range of motion.")
+
+    # past the distinct combinations, number the names
+    for i in range(len(MOVEMENTS) * len(EQUIPMENT) * len(VARIANTS), count):
+        yield (first_id + i, f"{rng.choice(MOVEMENTS)} Variation {i}", rng.choice(TYPES), rng.choice(MUSCLES),
+               rng.choice(EQUIPMENT).lower(), rng.choice(DIFFICULTIES), "")
+
+
+def member_rows(count, first_id, seed, password_hash):
+    """(id, username, first_name, last_name, email, image_url, bio, location, password) of `count` members"""
+
+    rng = random.Random(f"{seed}-members")
+
+    for member_id in range(first_id, first_id + count):
+        yield (member_id, f"member{member_id}", rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+               f"member{member_id}@example.com", "/static/images/default-pic.png", None,
+               rng.choice(LOCATIONS), password_hash)
+
+
+def workout_days(seed, member_id, workouts_per_member, days, today):
+    """The dates of a member's workouts, oldest first: a different number of distinct days for each member,
+    workouts_per_member on average"""
+
+    rng = random.Random(f"{seed}-workouts-{member_id}")
+    count = min(rng.randint(0, 2 * workouts_per_member), days)
+
+    return [today - timedelta(days=days_ago) for days_ago in sorted(rng.sample(range(days), count), reverse=True)]
+
+
+def workout_rows(members, first_member_id, first_workout_id, seed, workouts_per_member, days, today):
+    """(id, member_id, workout_date) of every generated member's workouts"""
+
+    workout_id = first_workout_id
+
+    for member_id in range(first_member_id, first_member_id + members):
+        for day in workout_days(seed, member_id, workouts_per_member, days, today):
+            yield (workout_id, member_id, day)
+            workout_id += 1
+
+
+def workout_exercise_rows(workouts, exercise_ids, seed, exercises_per_workout):
+    """(workout_id, exercise_id, workout_date) of each workout's exercises: a few distinct ones per workout,
+    popular exercises (the first ones in exercise_ids) much more often than the rest"""
+
+    # rank-based popularity: the n-th exercise is picked about 1/n as often as the first
+    cumulative_weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(exercise_ids) + 1)))
+    total = cumulative_weights[-1]
+    most = max(1, round(2 * exercises_per_workout) - 1)
+
+    for workout_id, member_id, day in workouts:
+        rng = random.Random(f"{seed}-workout-exercises-{workout_id}")
+        chosen = set()
+
+        for _ in range(rng.randint(1, most)):
+            chosen.add(exercise_ids[bisect.bisect_left(
+                cumulative_weights, rng.random() * total)])
+
+        for exercise_id in sorted(chosen):
+            yield (workout_id, exercise_id, day)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into table with COPY"""
+
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", CopyStream(rows))
+
+
+def next_id(cursor, table):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def generate(raw_connection, args, password_hash):
+    """Generate the population described by args into the database, in one transaction"""
+
+    cursor = raw_connection.cursor()
+    today = date.today()
+
+    # monthly partitions for the whole date range, when the tables are partitioned (migration 034)
+    cursor.execute("SELECT to_regproc('ensure_workout_partitions') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT ensure_workout_partitions(%s, %s)",
+                       (today - timedelta(days=args.days), today))
+
+    first_exercise_id = next_id(cursor, 'exercises')
+    copy_rows(cursor, 'exercises', ['id', 'name', 'type', 'muscle', 'equipment', 'difficulty', 'instructions'],
+              exercise_rows(args.exercises, first_exercise_id, args.seed))
+    print(f"copied {args.exercises} exercises")
+
+    first_member_id = next_id(cursor, 'members')
+    copy_rows(cursor, 'members', ['id', 'username', 'first_name', 'last_name', 'email', 'image_url', 'bio',
+                                  'location', 'password'],
+              member_rows(args.members, first_member_id, args.seed, password_hash))
+    print(f"copied {args.members} members")
+
+    first_workout_id = next_id(cursor, 'workouts')
+
+    def workouts():
+        return workout_rows(args.members, first_member_id, first_workout_id, args.seed,
+                            args.workouts_per_member, args.days, today)
+
+    copy_rows(cursor, 'workouts', [
+              'id', 'member_id', 'workout_date'], workouts())
+    print("copied workouts")
+
+    # the workouts are generated again (the same ones, from the same seed) rather than kept in memory
+    exercise_ids = list(range(first_exercise_id,
+                        first_exercise_id + args.exercises))
+    copy_rows(cursor, 'workout_exercises', ['workout_id', 'exercise_id', 'workout_date'],
+              workout_exercise_rows(workouts(), exercise_ids, args.seed, args.exercises_per_workout))
+    print("copied workout_exercises")
+
+    # ids were given explicitly, so move the sequences past them
+    for table in ('exercises', 'members', 'workouts'):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+
+    raw_connection.commit()
+
+    for table in ('exercises', 'members', 'workouts', 'workout_exercises'):
+        cursor.execute(f"ANALYZE {table}")
+    raw_connection.commit()
+
+
+def plan_nodes(plan):
+    """Every node of an EXPLAIN (FORMAT JSON) plan"""
+
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(raw_connection, dialect, statement):
+    """Return the JSON plan of a SQLAlchemy statement"""
+
+    compiled = statement.compile(dialect=dialect, compile_kwargs={
+                                 'render_postcompile': True})
+    cursor = raw_connection.cursor()
+    cursor.execute("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params)
+
+    return cursor.fetchone()[0][0]['Plan']
+
+
+def plan_problems(plan, empty_tables=()):
+    """Return what's wrong with a hot query's plan: whole big tables it scans, or no index used at all.
+    Scanning one of empty_tables (like the partitions of months to come) costs nothing and isn't a problem"""
+
+    problems = []
+
+    for node in plan_nodes(plan):
+        table = PARTITION_SUFFIX.sub('', node.get('Relation Name', ''))
+
+        if node['Node Type'] == 'Seq Scan' and table in BIG_TABLES and node['Relation Name'] not in empty_tables:
+            problems.append(f"sequential scan of {node['Relation Name']}")
+
+    if not any(node['Node Type'] in INDEX_SCANS for node in plan_nodes(plan)):
+        problems.append("no index used")
+
+    return problems
+
+
+def hot_queries(connection):
+    """The queries behind show_member, add_exercises_to_workout and exercise_description, for the newest
+    workout and exercise in the database, as (description, statement)"""
+
+    from app import (db, Exercise, member_workouts_query, workout_on_query,
+                     workout_exercises_query, exercise_named_query)
+
+    member_id, workout_id, workout_date = connection.execute(text(
+        "SELECT member_id, id, workout_date FROM workouts ORDER BY id DESC LIMIT 1")).first()
+    name = connection.execute(
+        text("SELECT name FROM exercises ORDER BY id DESC LIMIT 1")).scalar()
+
+    return [
+        ("show_member: log of workouts",
+         member_workouts_query(member_id).statement),
+        ("show_member: older workouts",
+         member_workouts_query(member_id, before=workout_date).statement),
+        ("add_exercises_to_workout: today's workout",
+         workout_on_query(member_id, workout_date).statement),
+        ("add_exercises_to_workout: selected exercises",
+         db.select([Exercise.id]).where(Exercise.name.in_([name]))),
+        ("add_exercises_to_workout: workout's exercises",
+         workout_exercises_query(workout_id, workout_date).statement),
+        ("exercise_description: exercise by name",
+         exercise_named_query(name).limit(1).statement),
+    ]
+
+
+def check_plans(engine):
+    """EXPLAIN every hot query. Returns (description, problems) for each"""
+
+    with engine.connect() as connection:
+        raw_connection = connection.connection
+
+        # tables (and partitions) that were empty when last analyzed
+        empty_tables = {name for name, in connection.execute(text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relpages = 0 AND reltuples <= 0"))}
+
+        return [(description, plan_problems(explain(raw_connection, engine.dialect, statement), empty_tables))
+                for description, statement in hot_queries(connection)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic data and check query plans at scale")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_command = commands.add_parser(
+        'generate', help="copy a synthetic population into the database")
+    generate_command.add_argument('--members', type=int, default=1000000)
+    generate_command.add_argument(
+        '--workouts-per-member', type=int, default=20)
+    generate_command.add_argument(
+        '--exercises-per-workout', type=float, default=2.5)
+    generate_command.add_argument('--exercises', type=int, default=3000)
+    generate_command.add_argument('--days', type=int, default=730,
+                                  help="spread the workouts over this many days up to today")
+    generate_command.add_argument('--seed', type=int, default=0)
+
+    commands.add_parser(
+        'check-plans', help="fail if a hot query doesn't use an index")
+
+    args = parser.parse_args()
+
+    from app import db
+    from models import bcrypt
+
+    if args.command == 'generate':
+        raw_connection = db.engine.raw_connection()
+        try:
+            generate(raw_connection, args, bcrypt.generate_password_hash(
+                'password').decode('UTF-8'))
+        finally:
+            raw_connection.close()
+
+    else:
+        failed = False
+
+        for description, problems in check_plans(db.engine):
+            print(f"{'FAIL' if problems else 'ok'}  {description}" +
+                  (f": {'; '.join(problems)}" if problems else ""))
+            failed = failed or bool(problems)
+
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,45 @@
+// Search-as-you-type for exercise names: asks /api/exercises/autocomplete for
+// matches to what's typed so far and lists them as links to the exercise details.
+$(function () {
+  const $search = $("#exercise-search");
+  const $suggestions = $("#exercise-suggestions");
+  let timer = null;
+  let lastQuery = "";
+
+  function showSuggestions(exercises) {
+    $suggestions.empty();
+
+    for (const name of exercises) {
+      const $link = $("<a>")
+        .addClass("exercise-suggestion")
+        .attr("href", "/exercises/" + encodeURIComponent(name))
+        .text(name);
+      $suggestions.append($("<li>").append($link));
+    }
+  }
+
+  $search.on("input", function () {
+    const query = $search.val().trim();
+
+    // wait for a short pause in typing before asking the server
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      if (query === lastQuery) {
+        return;
+      }
+      lastQuery = query;
+
+      if (!query) {
+        showSuggestions([]);
+        return;
+      }
+
+      $.getJSON("/api/exercises/autocomplete", { q: query }, function (data) {
+        // ignore answers to queries the member has already typed past
+        if (query === lastQuery) {
+          showSuggestions(data.exercises);
+        }
+      });
+    }, 100);
+  });
+});
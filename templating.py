@@ -0,0 +1,63 @@
+"""Template compilation for Capstone One Project
+
+Compiled templates are kept in a filesystem bytecode cache (TEMPLATE_CACHE_DIR,
+default instance/jinja_cache) that every worker process shares, so a template
+is compiled once per deploy instead of once per worker. Compile them all ahead
+of time, as part of a deploy, like:  python templating.py
+
+gunicorn workers also load every template when they start (see
+gunicorn.conf.py), so the first requests a new worker serves don't wait on
+loading templates. Templates aren't checked for changes on each render unless
+TEMPLATES_AUTO_RELOAD is set (or the app runs in debug mode).
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+from atomic_file import atomic_write
+
+
+class SharedBytecodeCache(FileSystemBytecodeCache):
+    """A FileSystemBytecodeCache whose files are written in one step, so a worker never reads one
+    another worker is halfway through writing"""
+
+    def dump_bytecode(self, bucket):
+        with atomic_write(self._get_cache_filename(bucket), 'wb') as file:
+            bucket.write_bytecode(file)
+
+
+def init_templates(app):
+    """Give the app's Jinja environment the shared bytecode cache, and turn off auto-reload outside debug mode"""
+
+    app.config.setdefault('TEMPLATE_CACHE_DIR', os.environ.get(
+        'TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache')))
+
+    auto_reload = os.environ.get('TEMPLATES_AUTO_RELOAD')
+    if app.config.get('TEMPLATES_AUTO_RELOAD') is None and auto_reload is not None:
+        app.config['TEMPLATES_AUTO_RELOAD'] = auto_reload.lower() in ('1', 'true', 'yes')
+
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+
+    app.jinja_env.bytecode_cache = SharedBytecodeCache(
+        app.config['TEMPLATE_CACHE_DIR'])
+    app.jinja_env.auto_reload = app.templates_auto_reload
+
+
+def compile_templates(app):
+    """Load every template, compiling any that aren't in the bytecode cache yet and keeping them in the
+    environment's in-memory cache. Returns the template names"""
+
+    names = [name for name in app.jinja_env.list_templates()
+             if name.endswith('.html')]
+
+    for name in names:
+        app.jinja_env.get_template(name)
+
+    return names
+
+
+if __name__ == "__main__":
+    from app import app
+
+    names = compile_templates(app)
+    print(f"compiled {len(names)} templates into {app.config['TEMPLATE_CACHE_DIR']}")
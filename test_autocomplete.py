@@ -0,0 +1,90 @@
+"""Exercise name autocomplete tests."""
+# run these tests like:  python -m unittest test_autocomplete.py
+
+from app import app
+import os
+from unittest import TestCase
+
+from models import db, Exercise
+from autocomplete import ExerciseNameIndex, within_distance
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Don't clutter tests with SQL
+app.config['SQLALCHEMY_ECHO'] = False
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class ExerciseNameIndexTestCase(TestCase):
+    """Tests for the in-memory exercise name prefix index."""
+
+    def setUp(self):
+        self.index = ExerciseNameIndex()
+        for name in ["Dumbbell Bench Press", "Barbell Bench Press", "Bench Dips",
+                     "Squat", "Jumping rope", "Push-up"]:
+            self.index.add(name)
+
+    def test_prefix(self):
+        self.assertEqual(self.index.complete("squ"), ["Squat"])
+        self.assertEqual(self.index.complete("JUMP"), ["Jumping rope"])
+
+    def test_whole_names_before_word_matches(self):
+        self.assertEqual(self.index.complete("bench"), [
+                         "Bench Dips", "Barbell Bench Press", "Dumbbell Bench Press"])
+
+    def test_word_match(self):
+        self.assertEqual(self.index.complete("press"), [
+                         "Barbell Bench Press", "Dumbbell Bench Press"])
+
+    def test_typo(self):
+        self.assertEqual(self.index.complete("sqaut"), ["Squat"])
+        self.assertEqual(self.index.complete("jumpnig"), ["Jumping rope"])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.complete("zzz"), [])
+        self.assertEqual(self.index.complete("   "), [])
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.complete("b", limit=2)), 2)
+
+    def test_add_is_idempotent(self):
+        self.index.add("Squat")
+        self.assertEqual(self.index.complete("squat"), ["Squat"])
+
+    def test_within_distance(self):
+        self.assertEqual(within_distance("squat", "squat", 1), 0)
+        self.assertEqual(within_distance("sqat", "squat", 1), 1)
+        self.assertIsNone(within_distance("lunge", "squat", 2))
+
+
+class ExerciseNameCatchUpTestCase(TestCase):
+    """Tests for indexing exercises saved by other workers."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def add_exercise(self, id, name):
+        db.session.add(Exercise(id=id, name=name, type="strength", muscle="quadriceps",
+                                equipment="barbell", difficulty="beginner", instructions=""))
+        db.session.commit()
+
+    def test_catch_up_indexes_exercises_committed_out_of_order(self):
+        index = ExerciseNameIndex()
+
+        # the exercise with id 1 commits after the one inserted behind it
+        self.add_exercise(2, "Squat")
+        index.catch_up()
+        self.assertIn(1, index.watermark.gaps)
+
+        self.add_exercise(1, "Deadlift")
+        index.catch_up()
+
+        self.assertEqual(index.complete("dead"), ["Deadlift"])
+        self.assertEqual(index.watermark.gaps, {})
@@ -0,0 +1,69 @@
+"""Shared exercise catalog tests."""
+# run these tests like:  python -m unittest test_catalog.py
+
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from unittest import TestCase
+
+from catalog import Catalog, SharedCatalog, write_catalog
+
+Row = namedtuple('Row', ['id', 'name', 'type', 'muscle',
+                         'equipment', 'difficulty', 'instructions'])
+
+ROWS = [
+    Row(3, "Squat", "strength", "quadriceps",
+        "barbell", "beginner", "Bend your knees."),
+    Row(1, "Jumping rope", "cardio", "quadriceps", "other", "beginner", ""),
+    Row(2, "Crêpe press", "strength", "chest",
+        "dumbbell", "expert", "Press ☺"),
+]
+
+
+class CatalogTestCase(TestCase):
+    """Tests for writing and memory-mapping catalog snapshots."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "exercise_catalog.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find(self):
+        write_catalog(self.path, ROWS)
+        catalog = Catalog(self.path)
+
+        self.assertEqual(len(catalog), 3)
+
+        squat = catalog.find("Squat")
+        self.assertEqual(squat.id, 3)
+        self.assertEqual(squat.muscle, "quadriceps")
+        self.assertEqual(squat.instructions, "Bend your knees.")
+
+        # non-ASCII names and instructions survive the round trip
+        press = catalog.find("Crêpe press")
+        self.assertEqual(press.instructions, "Press ☺")
+        self.assertEqual(press.equipment, "dumbbell")
+
+        self.assertIsNone(catalog.find("Squa"))
+        self.assertIsNone(catalog.find("Zercher squat"))
+
+    def test_empty_catalog(self):
+        write_catalog(self.path, [])
+
+        self.assertIsNone(Catalog(self.path).find("Squat"))
+
+    def test_shared_catalog_switches_to_new_snapshot(self):
+        shared = SharedCatalog(self.path, check_interval=0)
+
+        # no snapshot built yet
+        self.assertIsNone(shared.find("Squat"))
+
+        write_catalog(self.path, ROWS[:1])
+        self.assertIsNotNone(shared.find("Squat"))
+        self.assertIsNone(shared.find("Jumping rope"))
+
+        write_catalog(self.path, ROWS)
+        self.assertEqual(shared.find("Jumping rope").type, "cardio")
@@ -0,0 +1,110 @@
+"""Response compression tests."""
+# run these tests like:  python -m unittest test_compression.py
+
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from flask import Flask
+from flask_debugtoolbar import DebugToolbarExtension
+
+from compression import init_compression, precompress_static
+
+
+class CompressionTestCase(TestCase):
+    """Tests for compressing responses and serving precompressed static files."""
+
+    def setUp(self):
+        """Make a small app with its own static folder."""
+
+        self.static_folder = tempfile.mkdtemp()
+
+        with open(os.path.join(self.static_folder, 'style.css'), 'w') as file:
+            file.write("body { margin: 0; }\n" * 100)
+
+        self.app = Flask(__name__, static_folder=self.static_folder,
+                         static_url_path='/static')
+        init_compression(self.app)
+
+        @self.app.route('/big')
+        def big():
+            return "<p>Let's Workout!</p>" * 100
+
+        @self.app.route('/small')
+        def small():
+            return "<p>hi</p>"
+
+    def tearDown(self):
+        shutil.rmtree(self.static_folder)
+
+    def test_compresses_large_html(self):
+        with self.app.test_client() as client:
+
+            response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+            self.assertIn(b"Let's Workout!", gzip.decompress(response.data))
+
+    def test_skips_small_responses(self):
+        with self.app.test_client() as client:
+
+            response = client.get(
+                '/small', headers={'Accept-Encoding': 'gzip'})
+
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(response.data, b"<p>hi</p>")
+
+    def test_skips_when_not_accepted(self):
+        with self.app.test_client() as client:
+
+            response = client.get('/big')
+
+            self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_serves_precompressed_static(self):
+        written = precompress_static(self.static_folder)
+        self.assertIn(os.path.join(
+            self.static_folder, 'style.css.gz'), written)
+
+        with self.app.test_client() as client:
+
+            response = client.get(
+                '/static/style.css', headers={'Accept-Encoding': 'gzip'})
+
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(response.mimetype, 'text/css')
+            self.assertIn(b"margin", gzip.decompress(response.data))
+            response.close()
+
+
+class ToolbarCompressionTestCase(TestCase):
+    """Tests for compressing pages the debug toolbar is added to."""
+
+    def setUp(self):
+        """Make a small debug app with compression registered before the toolbar, like app.py."""
+
+        self.app = Flask(__name__)
+        self.app.debug = True
+        self.app.config['SECRET_KEY'] = 'test'
+        self.app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
+        self.app.config['DEBUG_TB_PANELS'] = []
+
+        init_compression(self.app)
+        DebugToolbarExtension(self.app)
+
+        @self.app.route('/page')
+        def page():
+            return "<html><body>" + "<p>Let's Workout!</p>" * 100 + "</body></html>"
+
+    def test_compresses_page_with_toolbar(self):
+        with self.app.test_client() as client:
+
+            response = client.get('/page', headers={'Accept-Encoding': 'gzip'})
+
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            html = gzip.decompress(response.data)
+            self.assertIn(b"Let's Workout!", html)
+            self.assertIn(b"flDebug", html)
@@ -0,0 +1,108 @@
+"""Tests for running the app in gevent workers."""
+# run these tests like:  python -m unittest test_concurrency.py
+
+from app import app, fetch_exercises
+import os
+import runpy
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from flask import g
+from sqlalchemy import event
+
+from models import db, Member
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+try:
+    import psycogreen.gevent
+    from gunicorn.workers.ggevent import GeventWorker
+    from gunicorn.workers.sync import SyncWorker
+except ImportError:
+    GeventWorker = None
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Don't clutter tests with SQL
+app.config['SQLALCHEMY_ECHO'] = False
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+@skipUnless(greenlet, "greenlet isn't installed")
+class GreenletSessionTestCase(TestCase):
+    """Each request greenlet gets its own database session."""
+
+    def session_in_greenlet(self):
+        with app.test_request_context():
+            return db.session()
+
+    def test_session_per_greenlet(self):
+        first = greenlet.greenlet(self.session_in_greenlet).switch()
+        second = greenlet.greenlet(self.session_in_greenlet).switch()
+
+        self.assertIsNot(first, second)
+        self.assertIsNot(first, db.session())
+
+
+@skipUnless(GeventWorker, "gunicorn, gevent or psycogreen isn't installed")
+class GunicornConfigTestCase(TestCase):
+    """psycopg2 is patched to yield to other greenlets only in gevent workers."""
+
+    def patched_after_fork(self, configured_worker_class, worker_class):
+        with patch.dict(os.environ, {'WORKER_CLASS': configured_worker_class}):
+            config = runpy.run_path(os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+
+        with patch('psycogreen.gevent.patch_psycopg') as patch_psycopg:
+            config['post_fork'](None, worker_class.__new__(worker_class))
+
+        return patch_psycopg.called
+
+    def test_worker_class_from_command_line(self):
+        # like gunicorn -k sync -c gunicorn.conf.py, and the other way round
+        self.assertFalse(self.patched_after_fork('gevent', SyncWorker))
+        self.assertTrue(self.patched_after_fork('sync', GeventWorker))
+
+
+class FetchExercisesTestCase(TestCase):
+    """Calling the exercise API gives the database connection back without losing the logged in member."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+        member = Member.signup(
+            "test1", "test1_firstname", "test1_lastname", "email1@email.com", "password", "test1image", "test1bio", "test1location")
+        db.session.commit()
+        self.member_id = member.id
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_member_kept_loaded(self):
+        with app.test_request_context():
+            g.member = Member.query.get(self.member_id)
+
+            with patch('exercise_api.fetch_exercises', return_value=[]):
+                fetch_exercises(type='cardio')
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            # reading the member's name (as base.html does) mustn't query the database again
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                self.assertEqual(g.member.first_name, "test1_firstname")
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+
+            self.assertIn(g.member, db.session)
+            self.assertEqual(statements, [])
@@ -0,0 +1,116 @@
+"""Exercise API single-flight tests."""
+# run these tests like:  python -m unittest test_exercise_api.py
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from exercise_api import SingleFlight, normalize_query
+
+
+class SingleFlightTestCase(TestCase):
+    """Tests for coalescing identical API lookups."""
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.single_flight = SingleFlight(lock_dir=self.lock_dir)
+        self.fetches = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir)
+
+    def slow_fetch(self):
+        """Pretend to be a slow API request"""
+
+        self.fetches += 1
+        time.sleep(0.2)
+        return [{"name": "Jumping rope", "type": "cardio"}]
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query({"name": " Jumping   Rope "}),
+                         normalize_query({"name": "jumping rope"}))
+        self.assertNotEqual(normalize_query({"type": "cardio"}),
+                            normalize_query({"type": "strength"}))
+
+    def test_concurrent_callers_share_one_fetch(self):
+        results = []
+
+        def call():
+            results.append(self.single_flight.do("type=cardio", self.slow_fetch))
+
+        threads = [threading.Thread(target=call) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_saved_result_shared_with_waiting_process(self):
+        # a second process (here a second SingleFlight on the same lock directory) reuses the saved result
+        self.single_flight.do("type=cardio", self.slow_fetch)
+
+        other_process = SingleFlight(lock_dir=self.lock_dir)
+        result = other_process.do("type=cardio", self.slow_fetch)
+
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(result[0]["name"], "Jumping rope")
+
+    def test_failures_are_not_shared(self):
+        self.single_flight.do("type=cardio", lambda: None)
+        result = self.single_flight.do("type=cardio", self.slow_fetch)
+
+        self.assertEqual(self.fetches, 1)
+        self.assertIsNotNone(result)
+
+    def test_lock_files_bounded_by_buckets(self):
+        single_flight = SingleFlight(lock_dir=self.lock_dir, buckets=4)
+
+        for i in range(20):
+            single_flight.do(f"name=exercise {i}", lambda: [])
+
+        # the lock file and at most one result file per bucket
+        self.assertLessEqual(len(os.listdir(self.lock_dir)), 5)
+
+    def test_bucket_result_only_shared_with_same_key(self):
+        single_flight = SingleFlight(lock_dir=self.lock_dir, buckets=1)
+        single_flight.do("type=cardio", self.slow_fetch)
+
+        result = single_flight.do("type=strength", lambda: [{"name": "Squat"}])
+
+        self.assertEqual(result[0]["name"], "Squat")
+
+    def test_other_keys_dont_wait_on_another_process(self):
+        started = multiprocessing.get_context('fork').Event()
+
+        def fetch_in_other_process():
+            def fetch():
+                started.set()
+                time.sleep(1)
+                return [{"name": "Jumping rope"}]
+
+            SingleFlight(lock_dir=self.lock_dir, buckets=1).do("type=cardio", fetch)
+
+        other_process = multiprocessing.get_context('fork').Process(target=fetch_in_other_process)
+        other_process.start()
+        self.assertTrue(started.wait(5))
+
+        # a different query (saving its result in the same bucket) goes ahead while the other process is fetching
+        single_flight = SingleFlight(lock_dir=self.lock_dir, buckets=1)
+        began = time.time()
+        result = single_flight.do("type=strength", lambda: [{"name": "Squat"}])
+        self.assertLess(time.time() - began, 0.5)
+        self.assertEqual(result[0]["name"], "Squat")
+
+        # the same query waits for the other process and reuses its result
+        result = single_flight.do("type=cardio", self.slow_fetch)
+        other_process.join()
+
+        self.assertEqual(self.fetches, 0)
+        self.assertEqual(result[0]["name"], "Jumping rope")
@@ -4,12 +4,15 @@
 from app import app, CURR_MEMBER_KEY
 import os
 from app import app
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
 import requests
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from flask import session
+from sqlalchemy import text
 
-from models import db, connect_db, Member, Exercise, Workout
+from archive_workouts import add_months, ensure_partitions, expire_submissions
+from models import db, connect_db, Member, Exercise, Workout, WorkoutExercise, ExerciseSet, WorkoutSubmission, WorkoutTemplate
 
 
 # BEFORE we import our app, let's set an environmental variable to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
@@ -32,6 +35,22 @@ db.create_all()
 # Don't have WTForms use CSRF at all, since it's a pain to test
 app.config['WTF_CSRF_ENABLED'] = False
 
+# Set TEST_MIGRATED_SCHEMA=1 to run against a database built by running migrations/*.sql (partitioned tables and all,
+# see the README) instead of one made by db.create_all(); its tables are emptied between tests instead of recreated
+MIGRATED_SCHEMA = bool(os.environ.get('TEST_MIGRATED_SCHEMA'))
+
+
+def reset_database():
+    """Start a test with empty tables"""
+
+    if MIGRATED_SCHEMA:
+        tables = ', '.join(table.name for table in db.metadata.sorted_tables)
+        db.session.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        db.session.commit()
+    else:
+        db.drop_all()
+        db.create_all()
+
 
 class ExerciseViewsTestCase(TestCase):
     """Tests for views of Exercise API."""
@@ -39,8 +58,7 @@ class ExerciseViewsTestCase(TestCase):
     def setUp(self):
         """Make demo data."""
 
-        db.drop_all()
-        db.create_all()
+        reset_database()
 
         self.testmember = Member.signup(
             username="testuser",
@@ -147,6 +165,370 @@ class ExerciseViewsTestCase(TestCase):
     def test_show_cardio_exercises_logged_out(self):
         with app.test_client() as client:
 
-            response = client.get("/exercises/cardio")
+            # anonymous requests don't look anything up from the API
+            with patch('exercise_api.fetch_exercises') as api_fetch:
+                response = client.get("/exercises/cardio")
             # if member is not logged in, redirects to "/" page (redirect has a status code of 302)
             self.assertEqual(response.status_code, 302)
+            api_fetch.assert_not_called()
+
+    def add_sample_workout(self, workout_date="2023-05-24"):
+        """Add a workout (a past one, by default) with two exercises for testmember"""
+
+        squat = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                         equipment="barbell", difficulty="beginner", instructions="")
+        rope = Exercise(name="Jumping rope", type="cardio", muscle="calves",
+                        equipment="rope", difficulty="beginner", instructions="")
+        workout = Workout(member_id=self.testmember.id,
+                          workout_date=workout_date)
+
+        db.session.add_all([squat, rope, workout])
+        db.session.commit()
+
+        # workout_exercises rows carry their workout's date, like the app's inserts
+        for exercise in (squat, rope):
+            db.session.add(WorkoutExercise(workout_id=workout.id, exercise_id=exercise.id,
+                                           workout_date=workout.workout_date))
+        db.session.commit()
+
+        return workout
+
+    def test_repeat_workout(self):
+        workout = self.add_sample_workout()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.post(
+                f"/members/{self.testmember.id}/workouts/{workout.id}/repeat")
+            # redirects to today's workout page
+            self.assertEqual(response.status_code, 302)
+
+            todays_workout = Workout.query.filter_by(
+                member_id=self.testmember.id, workout_date=datetime.now().date()).one()
+            self.assertEqual(sorted(exercise.name for exercise in todays_workout.exercises), [
+                             "Jumping rope", "Squat"])
+
+    def test_save_and_start_template(self):
+        workout = self.add_sample_workout()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.post(
+                f"/members/{self.testmember.id}/workouts/{workout.id}/template", data={"name": "Leg day"})
+            self.assertEqual(response.status_code, 302)
+
+            template = WorkoutTemplate.query.filter_by(
+                member_id=self.testmember.id).one()
+            self.assertEqual(template.name, "Leg day")
+            self.assertEqual(len(template.exercises), 2)
+
+            response = client.post(
+                f"/members/{self.testmember.id}/templates/{template.id}/start")
+            self.assertEqual(response.status_code, 302)
+
+            todays_workout = Workout.query.filter_by(
+                member_id=self.testmember.id, workout_date=datetime.now().date()).one()
+            self.assertEqual(len(todays_workout.exercises), 2)
+
+    def test_delete_member(self):
+        workout = self.add_sample_workout()
+        template = WorkoutTemplate(member_id=self.testmember.id, name="Leg day",
+                                   exercises=list(workout.exercises))
+        db.session.add(template)
+        db.session.commit()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.post("/members/delete")
+            self.assertEqual(response.status_code, 302)
+
+        # the database's cascades remove the member's history; the exercises stay in the catalog
+        self.assertEqual(Member.query.count(), 0)
+        self.assertEqual(Workout.query.count(), 0)
+        self.assertEqual(WorkoutExercise.query.count(), 0)
+        self.assertEqual(WorkoutTemplate.query.count(), 0)
+        self.assertEqual(Exercise.query.count(), 2)
+
+    def test_repeat_other_members_workout(self):
+        workout = self.add_sample_workout()
+        other = Member.signup("otheruser", "other", "member", "other@test.com",
+                              "password", "default_profile_pic.jpg", "", "")
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = other.id
+
+            response = client.post(
+                f"/members/{other.id}/workouts/{workout.id}/repeat", follow_redirects=True)
+
+            self.assertIn("Access unauthorized.", str(response.data))
+            self.assertEqual(Workout.query.filter_by(
+                member_id=other.id).count(), 0)
+
+    def test_autocomplete_exercises(self):
+        self.add_sample_workout()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.get("/api/exercises/autocomplete?q=jump")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json["exercises"], ["Jumping rope"])
+
+    def test_autocomplete_exercises_logged_out(self):
+        with app.test_client() as client:
+
+            response = client.get("/api/exercises/autocomplete?q=jump")
+
+            self.assertEqual(response.status_code, 401)
+
+    def test_show_member_pages_workouts(self):
+        for day in range(1, 4):
+            db.session.add(Workout(member_id=self.testmember.id,
+                                   workout_date=f"2023-05-0{day}"))
+        db.session.commit()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            # only the workouts older than 'before' are listed
+            response = client.get(
+                f"/members/{self.testmember.id}?before=2023-05-03")
+            html = response.get_data(as_text=True)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Tuesday May 02 2023", html)
+            self.assertNotIn("Wednesday May 03 2023", html)
+
+    def test_show_member_workout_with_date(self):
+        workout = self.add_sample_workout()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.get(
+                f"/members/{self.testmember.id}/workouts/{workout.id}?date=2023-05-24")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Jumping rope", str(response.data))
+
+            # the workout isn't from that date
+            response = client.get(
+                f"/members/{self.testmember.id}/workouts/{workout.id}?date=2023-05-25")
+            self.assertEqual(response.status_code, 404)
+
+    def test_log_sets(self):
+        workout = self.add_sample_workout()
+        squat = Exercise.query.filter_by(name="Squat").one()
+        rope = Exercise.query.filter_by(name="Jumping rope").one()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            # one row per set; the blank third row is skipped
+            response = client.post(f"/members/{self.testmember.id}/workouts/{workout.id}/sets?date=2023-05-24", data={
+                "exercise_id": [squat.id, squat.id, squat.id, rope.id],
+                "reps": ["5", "5", "", ""],
+                "weight": ["100", "102.5", "", ""],
+                "duration": ["", "", "", "120"],
+                "rpe": ["7", "8.5", "", ""],
+            }, follow_redirects=True)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Logged 3 sets!", str(response.data))
+
+            sets = ExerciseSet.query.order_by(ExerciseSet.id).all()
+            self.assertEqual([(s.exercise_id, s.set_number, s.reps, s.weight, s.duration, s.rpe) for s in sets], [
+                (squat.id, 1, 5, 100, None, 7),
+                (squat.id, 2, 5, 102.5, None, 8.5),
+                (rope.id, 1, None, None, 120, None)])
+
+    def test_logged_zero_weight_shown(self):
+        workout = self.add_sample_workout(datetime.now().date())
+        squat = Exercise.query.filter_by(name="Squat").one()
+        db.session.add(ExerciseSet(member_id=self.testmember.id, workout_id=workout.id, workout_date=workout.workout_date,
+                                   exercise_id=squat.id, set_number=1, reps=8, weight=0))
+        db.session.commit()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            # a bodyweight set logged with weight 0 shows the 0, not a blank
+            response = client.get(f"/members/{self.testmember.id}/workout_page")
+            html = response.get_data(as_text=True)
+
+            self.assertIn("<td>8</td>", html)
+            self.assertIn("<td>0.0</td>", html)
+
+    def test_log_sets_invalid(self):
+        workout = self.add_sample_workout()
+        squat = Exercise.query.filter_by(name="Squat").one()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.post(f"/members/{self.testmember.id}/workouts/{workout.id}/sets?date=2023-05-24", data={
+                "exercise_id": [squat.id], "reps": ["5"], "weight": ["100"], "duration": [""], "rpe": ["11"],
+            })
+
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(ExerciseSet.query.count(), 0)
+
+    def test_log_sets_empty(self):
+        workout = self.add_sample_workout()
+        squat = Exercise.query.filter_by(name="Squat").one()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.post(f"/members/{self.testmember.id}/workouts/{workout.id}/sets?date=2023-05-24", data={
+                "exercise_id": [squat.id], "reps": [""], "weight": [""], "duration": [""], "rpe": [""],
+            }, follow_redirects=True)
+
+            self.assertIn("alert-warning", str(response.data))
+            self.assertNotIn("Logged 0 sets!", str(response.data))
+            self.assertEqual(ExerciseSet.query.count(), 0)
+
+    def test_progression_endpoints(self):
+        workout = self.add_sample_workout()
+        squat = Exercise.query.filter_by(name="Squat").one()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            client.post(f"/members/{self.testmember.id}/workouts/{workout.id}/sets?date=2023-05-24", data={
+                "exercise_id": [squat.id], "reps": ["3"], "weight": ["110"], "duration": [""], "rpe": [""],
+            })
+
+            response = client.get(f"/api/members/{self.testmember.id}/records")
+            self.assertEqual(response.get_json()["records"][0]["best_estimated_1rm"]["estimated_1rm"], 121)
+
+            response = client.get(
+                f"/api/members/{self.testmember.id}/exercises/{squat.id}/progression?since=2023-05-01")
+            self.assertEqual(response.get_json()["progression"], [
+                {"workout_date": "2023-05-24", "estimated_1rm": 121, "best_so_far": 121, "moving_average": 121}])
+
+    def test_progression_logged_out(self):
+        with app.test_client() as client:
+            response = client.get(f"/api/members/{self.testmember.id}/records")
+
+            self.assertEqual(response.status_code, 401)
+
+    def test_follow_and_feed(self):
+        other = Member.signup("otheruser", "Other", "Member", "other@test.com",
+                              "password", "default_profile_pic.jpg", "bio", "location")
+        squat = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                         equipment="barbell", difficulty="beginner", instructions="")
+        db.session.add(squat)
+        db.session.commit()
+        other_id = other.id
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            client.post(f"/members/follow/{other_id}")
+
+            # the followed member saves a workout; it's fanned out to testmember's feed
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = other_id
+            client.post(f"/members/{other_id}/workout_page",
+                        data={"type-of-exercise": "Squat"})
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            response = client.get("/feed")
+            self.assertIn("Other Member", str(response.data))
+            self.assertIn("Squat", str(response.data))
+
+            # unfollowing takes their workouts out of the feed
+            client.post(f"/members/stop-following/{other_id}")
+            response = client.get("/feed")
+            self.assertNotIn("Other Member", str(response.data))
+
+    def test_add_exercises_to_workout_idempotent(self):
+        squat = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                         equipment="barbell", difficulty="beginner", instructions="")
+        db.session.add(squat)
+        db.session.commit()
+
+        with app.test_client() as client:
+
+            with client.session_transaction() as change_session:
+                change_session[CURR_MEMBER_KEY] = self.testmember.id
+
+            form = {"type-of-exercise": "Squat",
+                    "submission_key": "0b6f3e9a-6d1c-4c39-9a8e-2f1d5c7b8a90"}
+
+            # the same form submitted twice, then a new form with the same exercise
+            for data in (form, form, {"type-of-exercise": "Squat"}):
+                response = client.post(
+                    f"/members/{self.testmember.id}/workout_page", data=data)
+                self.assertEqual(response.status_code, 200)
+
+            self.assertEqual(Workout.query.filter_by(
+                member_id=self.testmember.id).count(), 1)
+            self.assertEqual(WorkoutExercise.query.count(), 1)
+            self.assertEqual(WorkoutSubmission.query.count(), 1)
+
+    def test_expire_submissions(self):
+        db.session.add_all([
+            WorkoutSubmission(key="old", member_id=self.testmember.id,
+                              created_at=datetime.utcnow() - timedelta(days=8)),
+            WorkoutSubmission(key="new", member_id=self.testmember.id)])
+        db.session.commit()
+
+        self.assertEqual(expire_submissions(db.session.connection(), 7), 1)
+        db.session.commit()
+
+        self.assertEqual([submission.key for submission in WorkoutSubmission.query], ["new"])
+
+    @skipUnless(MIGRATED_SCHEMA, "needs the partitioned tables from migrations/")
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        # a workout dated past the partitions that exist lands in the DEFAULT partition
+        future_month = add_months(date.today(), 18)
+        workout_id = self.add_sample_workout(future_month).id
+        db.session.add(ExerciseSet(member_id=self.testmember.id, workout_id=workout_id, workout_date=future_month,
+                                   exercise_id=Exercise.query.first().id, set_number=1, reps=5))
+        db.session.commit()
+
+        ensure_partitions(db.session.connection(), 18)
+        db.session.commit()
+
+        partition = f"workouts_p{future_month:%Y_%m}"
+        self.assertEqual(db.session.execute(text("SELECT tableoid::regclass::text FROM workouts WHERE id = :id"),
+                                            {'id': workout_id}).scalar(), partition)
+        self.assertEqual(WorkoutExercise.query.filter_by(workout_id=workout_id).count(), 2)
+        self.assertEqual(ExerciseSet.query.filter_by(workout_id=workout_id).one().reps, 5)
+
+        # and the next run has nothing left to do
+        ensure_partitions(db.session.connection(), 18)
+        db.session.commit()
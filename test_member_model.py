@@ -7,7 +7,7 @@ from unittest import TestCase
 from sqlalchemy import exc
 
 
-from models import db, Exercise, Member
+from models import db, Exercise, Member, Workout, WorkoutExercise
 
 # BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
 os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
@@ -146,3 +146,23 @@ class MemberModelTestCase(TestCase):
     def test_wrong_password(self):
         self.assertFalse(Member.authenticate(
             self.member1.username, "badpassword"))
+
+    #####################################################################
+    # Deletion Tests
+    ####################################################################
+
+    def test_delete_member_cascades(self):
+        exercise = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                            equipment="barbell", difficulty="beginner", instructions="")
+        workout = Workout(member_id=self.member1.id, workout_date="2023-05-24")
+        workout.exercises.append(exercise)
+        db.session.add(workout)
+        db.session.commit()
+
+        db.session.delete(Member.query.get(self.member1.id))
+        db.session.commit()
+
+        # the member's workouts and their exercise links are gone, but the shared exercise stays in the catalog
+        self.assertEqual(Workout.query.count(), 0)
+        self.assertEqual(WorkoutExercise.query.count(), 0)
+        self.assertEqual(Exercise.query.filter_by(name="Squat").count(), 1)
@@ -0,0 +1,29 @@
+#!/bin/sh
+# Run the view tests against a database built by running migrations/*.sql, which has the
+# production schema (workouts partitioned by month with a DEFAULT partition, composite
+# foreign keys, ON CONFLICT against partitioned tables), instead of the unpartitioned
+# tables db.create_all() makes. The app is started once between the base schema and the
+# later migrations, like an upgrade. Drops and recreates the database each time.
+#
+# run like:  ./test_migrated_schema.sh [database name, default exercises_migrated]
+
+set -e
+cd "$(dirname "$0")"
+
+database=${1:-exercises_migrated}
+
+dropdb --if-exists "$database"
+createdb "$database"
+
+psql -q -v ON_ERROR_STOP=1 "$database" -f migrations/000_base_schema.sql > /dev/null
+
+# an upgraded app started before the rest of the migrations mustn't create any tables they then trip over
+DATABASE_URL="postgresql:///$database" SQLALCHEMY_ECHO= python -c "import app"
+
+for file in migrations/*.sql; do
+    if [ "$file" != migrations/000_base_schema.sql ]; then
+        psql -q -v ON_ERROR_STOP=1 "$database" -f "$file" > /dev/null
+    fi
+done
+
+TEST_MIGRATED_SCHEMA=1 DATABASE_URL="postgresql:///$database" python -m unittest test_exercise_views.py
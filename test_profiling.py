@@ -0,0 +1,148 @@
+"""Request profiling and slow query logging tests."""
+# run these tests like:  python -m unittest test_profiling.py
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase, skipUnless
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from profiling import init_profiling
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+# a request profiled in a gevent worker, run in its own interpreter since monkey-patching can't be undone
+GEVENT_PROFILE_SCRIPT = """
+from gevent import monkey
+monkey.patch_all()
+
+import sys
+import gevent
+from flask import Flask
+from sqlalchemy import create_engine
+from profiling import init_profiling
+
+app = Flask(__name__)
+app.config['PROFILE_TOKEN'] = "secret"
+app.config['PROFILE_DIR'] = sys.argv[1]
+app.config['PROFILE_INTERVAL'] = 0.001
+init_profiling(app, create_engine("sqlite://"))
+
+@app.route('/wait')
+def wait():
+    gevent.sleep(0.05)
+    return "done"
+
+with app.test_client() as client:
+    client.get('/wait', headers={'X-Profile': 'secret'})
+"""
+
+
+class ProfilingTestCase(TestCase):
+    """Tests for opt-in request profiles and the slow query log."""
+
+    def setUp(self):
+        """Make a small app with its own profile directory and database engine."""
+
+        self.profile_dir = tempfile.mkdtemp()
+        self.engine = create_engine("sqlite://")
+
+        self.app = Flask(__name__)
+        self.app.config['PROFILE_TOKEN'] = "secret"
+        self.app.config['PROFILE_DIR'] = self.profile_dir
+        self.app.config['PROFILE_INTERVAL'] = 0.001
+        init_profiling(self.app, self.engine)
+
+        @self.app.route('/slow')
+        def slow():
+            time.sleep(0.05)
+            return "done"
+
+        @self.app.route('/query')
+        def query():
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return "done"
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def test_profile_with_token(self):
+        with self.app.test_client() as client:
+
+            response = client.get('/slow', headers={'X-Profile': 'secret'})
+            self.assertEqual(response.status_code, 200)
+
+        profiles = os.listdir(self.profile_dir)
+        self.assertEqual(len(profiles), 1)
+        self.assertIn("slow", profiles[0])
+
+        with open(os.path.join(self.profile_dir, profiles[0])) as file:
+            # each line is a folded stack followed by its sample count
+            stack, count = file.readline().rsplit(' ', 1)
+        self.assertIn("slow (test_profiling.py", stack)
+        self.assertGreater(int(count), 0)
+
+    def test_no_profile_without_token(self):
+        with self.app.test_client() as client:
+
+            client.get('/slow')
+            client.get('/slow', headers={'X-Profile': 'wrong'})
+
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_slow_query_logged_with_route(self):
+        self.app.config['SLOW_QUERY_MS'] = 0
+
+        with self.app.test_client() as client:
+            with self.assertLogs(self.app.logger, level='WARNING') as logs:
+                client.get('/query')
+
+        self.assertIn("in query: SELECT 1", logs.output[0])
+
+    def test_slow_query_explained_with_or_without_transaction(self):
+        engine = create_engine(os.environ.get(
+            'DATABASE_URL', "postgresql:///exercises_test"))
+        app = Flask(__name__)
+        app.config['SLOW_QUERY_MS'] = 0
+        init_profiling(app, engine)
+
+        try:
+            with self.assertLogs(app.logger, level='WARNING') as logs:
+                # no transaction (and no savepoint) on an autocommit connection, like archive_workouts.py's
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    self.assertEqual(connection.execute(
+                        text("SELECT 1")).scalar(), 1)
+
+                # in a transaction, explaining leaves it usable
+                with engine.begin() as connection:
+                    connection.execute(text("SELECT 2"))
+                    self.assertEqual(connection.execute(
+                        text("SELECT 4")).scalar(), 4)
+        finally:
+            engine.dispose()
+
+        plans = {line.split(': ', 1)[1].split('\n')[0]: line for line in logs.output}
+        self.assertIn("Result", plans["SELECT 1"])
+        self.assertIn("Result", plans["SELECT 2"])
+        self.assertIn("Result", plans["SELECT 4"])
+
+    @skipUnless(gevent, "gevent isn't installed")
+    def test_profile_in_gevent_worker(self):
+        subprocess.run([sys.executable, '-c', GEVENT_PROFILE_SCRIPT, self.profile_dir],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+        profiles = os.listdir(self.profile_dir)
+        self.assertEqual(len(profiles), 1)
+
+        with open(os.path.join(self.profile_dir, profiles[0])) as file:
+            stacks = file.read()
+        self.assertIn("wait (<string>", stacks)
@@ -0,0 +1,80 @@
+"""Strength progression tests."""
+# run these tests like:  python -m unittest test_progression.py
+
+from app import app
+import os
+from datetime import date
+from unittest import TestCase
+
+from models import db, Member, Workout, Exercise, ExerciseSet
+from progression import personal_records, estimated_1rm_trend
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Don't clutter tests with SQL
+app.config['SQLALCHEMY_ECHO'] = False
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class ProgressionTestCase(TestCase):
+    """Tests for personal records and estimated 1RM trends."""
+
+    def setUp(self):
+        """Create a member with three squat workouts."""
+
+        db.drop_all()
+        db.create_all()
+
+        self.member = Member.signup(
+            "test1", "test1_firstname", "test1_lastname", "email1@email.com", "password", "test1image", "test1bio", "test1location")
+
+        self.squat = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                              equipment="barbell", difficulty="beginner", instructions="")
+        db.session.add(self.squat)
+        db.session.commit()
+
+        # estimated 1RMs: 121 (3 x 110) on the first day, 130 (a single) on the second, 152 (8 x 120) on the third
+        self.log_sets(date(2023, 5, 1), [(5, 100), (3, 110)])
+        self.log_sets(date(2023, 5, 3), [(1, 130)])
+        self.log_sets(date(2023, 5, 5), [(8, 120), (10, 0)])
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def log_sets(self, workout_date, sets):
+        workout = Workout(member_id=self.member.id, workout_date=workout_date)
+        db.session.add(workout)
+        db.session.commit()
+
+        for set_number, (reps, weight) in enumerate(sets, 1):
+            db.session.add(ExerciseSet(member_id=self.member.id, workout_id=workout.id, exercise_id=self.squat.id,
+                                       workout_date=workout_date, set_number=set_number, reps=reps, weight=weight))
+        db.session.commit()
+
+    def test_personal_records(self):
+        records = personal_records(self.member.id)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["name"], "Squat")
+        self.assertEqual(records[0]["heaviest"]["weight"], 130)
+        self.assertEqual(records[0]["heaviest"]["workout_date"], "2023-05-03")
+        self.assertEqual(records[0]["best_estimated_1rm"]["estimated_1rm"], 152)
+        self.assertEqual(records[0]["best_estimated_1rm"]["reps"], 8)
+
+    def test_estimated_1rm_trend(self):
+        trend = estimated_1rm_trend(self.member.id, self.squat.id, date.min)
+
+        self.assertEqual([day["workout_date"] for day in trend], [
+                         "2023-05-01", "2023-05-03", "2023-05-05"])
+        self.assertEqual([day["estimated_1rm"] for day in trend], [121, 130, 152])
+        self.assertEqual([day["best_so_far"] for day in trend], [121, 130, 152])
+        self.assertEqual([day["moving_average"] for day in trend], [121, 125.5, 134.3])
+
+    def test_estimated_1rm_trend_since(self):
+        trend = estimated_1rm_trend(self.member.id, self.squat.id, date(2023, 5, 2))
+
+        self.assertEqual([day["workout_date"] for day in trend], [
+                         "2023-05-03", "2023-05-05"])
@@ -0,0 +1,136 @@
+"""Exercise recommendation tests."""
+# run these tests like:  python -m unittest test_recommendations.py
+
+from app import app
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest import TestCase
+
+from models import db, Member, Workout, WorkoutExercise, Exercise
+from recommendations import ExerciseRecommender
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Don't clutter tests with SQL
+app.config['SQLALCHEMY_ECHO'] = False
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class ExerciseRecommenderTestCase(TestCase):
+    """Tests for "members who did X also did Y" counts."""
+
+    def setUp(self):
+        """Create a member with two workouts, add sample exercises."""
+
+        db.drop_all()
+        db.create_all()
+
+        member = Member.signup(
+            "test1", "test1_firstname", "test1_lastname", "email1@email.com", "password", "test1image", "test1bio", "test1location")
+
+        self.exercises = {}
+        for name in ["Squat", "Deadlift", "Bench press", "Rowing"]:
+            exercise = Exercise(name=name, type="strength", muscle="quadriceps",
+                                equipment="barbell", difficulty="beginner", instructions="")
+            db.session.add(exercise)
+            self.exercises[name] = exercise
+
+        self.workout1 = Workout(member_id=member.id, workout_date=date(2023, 5, 24))
+        self.workout2 = Workout(member_id=member.id, workout_date=date(2023, 5, 25))
+        db.session.add_all([self.workout1, self.workout2])
+        db.session.commit()
+
+        self.add_to_workout(self.workout1, ["Squat", "Deadlift", "Bench press"])
+        self.add_to_workout(self.workout2, ["Squat", "Deadlift"])
+
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(
+            self.snapshot_dir, "recommendations.json")
+
+    def tearDown(self):
+        db.session.rollback()
+        shutil.rmtree(self.snapshot_dir)
+
+    def add_to_workout(self, workout, names, id=None):
+        for name in names:
+            db.session.add(WorkoutExercise(
+                id=id, workout_id=workout.id, exercise_id=self.exercises[name].id, workout_date=workout.workout_date))
+        db.session.commit()
+
+    def test_counts_existing_workouts(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.rebuild()
+
+        self.assertEqual(recommender.counts["Squat"]["Deadlift"], 2)
+        self.assertEqual(recommender.counts["Bench press"]["Squat"], 1)
+        self.assertEqual(recommender.top("Squat"), ["Deadlift", "Bench press"])
+
+    def test_catch_up_counts_only_new_rows(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.rebuild()
+
+        # adding Rowing to workout 2 pairs it with Squat and Deadlift, without recounting Squat/Deadlift
+        self.add_to_workout(self.workout2, ["Rowing"])
+        recommender.catch_up()
+
+        self.assertEqual(recommender.counts["Squat"]["Deadlift"], 2)
+        self.assertEqual(recommender.counts["Rowing"]["Squat"], 1)
+        self.assertEqual(recommender.suggest_for(
+            ["Squat", "Deadlift"]), ["Rowing", "Bench press"])
+
+    def test_catch_up_counts_rows_committed_out_of_order(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.rebuild()
+        first_id = recommender.watermark.value + 1
+
+        # the row with the next id commits after the one inserted behind it
+        self.add_to_workout(self.workout2, ["Rowing"], id=first_id + 1)
+        recommender.catch_up()
+        self.assertIn(first_id, recommender.watermark.gaps)
+
+        self.add_to_workout(self.workout1, ["Rowing"], id=first_id)
+        recommender.catch_up()
+        recommender.catch_up()
+
+        self.assertEqual(recommender.watermark.gaps, {})
+        self.assertEqual(recommender.counts["Rowing"]["Squat"], 2)
+        self.assertEqual(recommender.counts["Rowing"]["Bench press"], 1)
+        self.assertEqual(recommender.counts["Squat"]["Deadlift"], 2)
+
+    def test_catch_up_leaves_snapshot_alone(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.rebuild()
+        recommender.save()
+        with open(self.snapshot_path) as file:
+            saved = file.read()
+
+        # only the offline rebuild writes snapshots, never a request
+        self.add_to_workout(self.workout2, ["Rowing"])
+        recommender.catch_up()
+
+        with open(self.snapshot_path) as file:
+            self.assertEqual(file.read(), saved)
+
+    def test_no_snapshot_counts_nothing(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.catch_up()
+
+        self.assertFalse(recommender.loaded)
+        self.assertEqual(recommender.top("Squat"), [])
+
+    def test_snapshot_round_trip(self):
+        recommender = ExerciseRecommender(self.snapshot_path)
+        recommender.rebuild()
+        recommender.save()
+
+        restarted = ExerciseRecommender(self.snapshot_path)
+        restarted.load()
+        restarted.catch_up()
+
+        self.assertEqual(restarted.watermark.value, recommender.watermark.value)
+        self.assertEqual(restarted.counts, recommender.counts)
@@ -0,0 +1,68 @@
+"""Synthetic data and query plan tests."""
+# run these tests like:  python -m unittest test_seed.py
+#
+# The query plan check only means something on a database filled by seed.py; point SEEDED_DATABASE_URL at one
+# (e.g. postgresql:///exercise_scale) to run it.
+
+from app import app
+import os
+from datetime import date
+from unittest import TestCase, skipUnless
+
+from sqlalchemy import create_engine
+
+from seed import CopyStream, workout_rows, workout_exercise_rows, check_plans
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class SeedTestCase(TestCase):
+    """Tests for the synthetic data generator."""
+
+    def generate(self, seed):
+        workouts = list(workout_rows(100, 1, 1, seed, 20, 365, date(2023, 5, 24)))
+        links = list(workout_exercise_rows(
+            workouts, list(range(1, 501)), seed, 2.5))
+
+        return workouts, links
+
+    def test_same_seed_same_rows(self):
+        self.assertEqual(self.generate(1), self.generate(1))
+        self.assertNotEqual(self.generate(1), self.generate(2))
+
+    def test_rows_fit_the_constraints(self):
+        workouts, links = self.generate(1)
+
+        # one workout per member per day, each exercise once per workout, on its workout's date
+        self.assertEqual(len({(member_id, day) for workout_id, member_id, day in workouts}), len(workouts))
+        self.assertEqual(len({(workout_id, exercise_id) for workout_id, exercise_id, day in links}), len(links))
+
+        dates = {workout_id: day for workout_id, member_id, day in workouts}
+        self.assertTrue(all(dates[workout_id] == day for workout_id, exercise_id, day in links))
+
+    def test_copy_stream(self):
+        stream = CopyStream([(1, "Squat, Barbell", None), (2, "Row", "")])
+
+        data = ''
+        while True:
+            chunk = stream.read(7)
+            if not chunk:
+                break
+            data += chunk
+
+        self.assertEqual(data, '1,"Squat, Barbell",\n2,Row,\n')
+
+
+@skipUnless(os.environ.get('SEEDED_DATABASE_URL'), "needs a database filled by seed.py")
+class QueryPlanTestCase(TestCase):
+    """The hot queries use indexes at production scale."""
+
+    def test_hot_queries_use_indexes(self):
+        engine = create_engine(os.environ['SEEDED_DATABASE_URL'])
+
+        for description, problems in check_plans(engine):
+            self.assertEqual(problems, [], description)
@@ -0,0 +1,58 @@
+"""Template compilation tests."""
+# run these tests like:  python -m unittest test_templating.py
+
+from app import app
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from flask import Flask
+
+from templating import init_templates, compile_templates
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class TemplatingTestCase(TestCase):
+    """Tests for the shared template bytecode cache."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def make_app(self):
+        """A fresh app over the same templates, like a newly started worker"""
+
+        new_app = Flask('app', root_path=app.root_path)
+        new_app.config['TEMPLATE_CACHE_DIR'] = self.cache_dir
+        init_templates(new_app)
+
+        return new_app
+
+    def test_compile_templates_fills_cache(self):
+        names = compile_templates(self.make_app())
+
+        self.assertIn('base.html', names)
+        self.assertIn('member_profile.html', names)
+        self.assertEqual(len(os.listdir(self.cache_dir)), len(names))
+
+    def test_new_worker_loads_from_cache(self):
+        compile_templates(self.make_app())
+        cached = sorted(os.listdir(self.cache_dir))
+
+        worker_app = self.make_app()
+        worker_app.jinja_env.bytecode_cache.dump_bytecode = lambda bucket: self.fail(
+            f"{bucket.key} was compiled again")
+        compile_templates(worker_app)
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), cached)
+
+    def test_auto_reload_off_outside_debug(self):
+        self.assertFalse(self.make_app().jinja_env.auto_reload)
@@ -0,0 +1,150 @@
+"""Activity feed tests."""
+# run these tests like:  python -m unittest test_timeline.py
+
+from app import app
+import os
+from datetime import date
+from unittest import TestCase
+
+from models import db, Member, Workout, WorkoutExercise, Exercise, TimelineEntry
+from timeline import fan_out_workout, backfill_timeline, read_timeline
+
+# BEFORE we import our app, let's set an environmental variable  to use a different database for tests (we need to do this before we import our app, since that will have already connected to the database)
+os.environ['DATABASE_URL'] = "postgresql:///exercises_test"
+
+# Don't clutter tests with SQL
+app.config['SQLALCHEMY_ECHO'] = False
+
+# Make Flask errors be real errors, rather than HTML pages with error info
+app.config['TESTING'] = True
+
+
+class TimelineTestCase(TestCase):
+    """Tests for fan-out of workouts to followers' timelines."""
+
+    def setUp(self):
+        """Create a member followed by three others."""
+
+        db.drop_all()
+        db.create_all()
+
+        self.author = Member.signup(
+            "author", "author_firstname", "author_lastname", "author@email.com", "password", "image", "bio", "location")
+
+        self.followers = []
+        for i in range(3):
+            follower = Member.signup(
+                f"follower{i}", "firstname", "lastname", f"follower{i}@email.com", "password", "image", "bio", "location")
+            follower.following.append(self.author)
+            self.followers.append(follower)
+        db.session.commit()
+
+        self.squat = Exercise(name="Squat", type="strength", muscle="quadriceps",
+                              equipment="barbell", difficulty="beginner", instructions="")
+        db.session.add(self.squat)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def add_workout(self, workout_date, author=None):
+        workout = Workout(member_id=(author or self.author).id,
+                          workout_date=workout_date)
+        db.session.add(workout)
+        db.session.commit()
+
+        db.session.add(WorkoutExercise(workout_id=workout.id,
+                       exercise_id=self.squat.id, workout_date=workout_date))
+        db.session.commit()
+
+        return workout
+
+    def add_other_author(self):
+        """Another member followed by the first follower"""
+
+        other = Member.signup(
+            "other", "other_firstname", "other_lastname", "other@email.com", "password", "image", "bio", "location")
+        self.followers[0].following.append(other)
+        db.session.commit()
+
+        return other
+
+    def test_fan_out_in_batches(self):
+        workout = self.add_workout(date(2023, 5, 24))
+
+        fan_out_workout(workout, ["Squat", "Squat"], batch_size=2)
+
+        for follower in self.followers:
+            entries, older = read_timeline(follower.id)
+            self.assertEqual([(entry.workout_id, entry.exercise_names)
+                             for entry in entries], [(workout.id, "Squat")])
+            self.assertIsNone(older)
+
+        # the author's own timeline only has the members they follow
+        self.assertEqual(read_timeline(self.author.id)[0], [])
+
+    def test_fan_out_again_moves_workout_to_top(self):
+        other = self.add_other_author()
+        first = self.add_workout(date(2023, 5, 24))
+        second = self.add_workout(date(2023, 5, 24), author=other)
+
+        fan_out_workout(first, ["Squat"], batch_size=2)
+        fan_out_workout(second, ["Squat"], batch_size=2)
+        fan_out_workout(first, ["Squat", "Deadlift"], batch_size=2)
+
+        entries, older = read_timeline(self.followers[0].id)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         first.id, second.id])
+        self.assertEqual(entries[0].exercise_names, "Squat, Deadlift")
+
+        for follower in self.followers[1:]:
+            self.assertEqual([entry.exercise_names for entry in read_timeline(follower.id)[0]], [
+                             "Squat, Deadlift"])
+
+    def test_timelines_are_capped_and_paged(self):
+        workouts = [self.add_workout(date(2023, 5, day)) for day in range(1, 6)]
+
+        for workout in workouts:
+            fan_out_workout(workout, ["Squat"], timeline_length=4)
+
+        self.assertEqual(TimelineEntry.query.filter_by(
+            member_id=self.followers[0].id).count(), 4)
+
+        entries, older = read_timeline(self.followers[0].id, page_size=3)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         workouts[4].id, workouts[3].id, workouts[2].id])
+
+        entries, older = read_timeline(
+            self.followers[0].id, before=older, page_size=3)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         workouts[1].id])
+        self.assertIsNone(older)
+
+    def test_backfill_timeline(self):
+        workouts = [self.add_workout(date(2023, 5, day)) for day in range(1, 4)]
+
+        backfill_timeline(self.followers[0].id, self.author.id, workouts=2)
+        db.session.commit()
+
+        entries, older = read_timeline(self.followers[0].id)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         workouts[2].id, workouts[1].id])
+
+    def test_backfill_sorted_by_workout_date(self):
+        other = self.add_other_author()
+        newer = self.add_workout(date(2023, 5, 24), author=other)
+        fan_out_workout(newer, ["Squat"])
+
+        # following the author later copies in their older workouts below the newer one
+        older_workouts = [self.add_workout(date(2023, 5, day)) for day in range(1, 3)]
+        backfill_timeline(self.followers[0].id, self.author.id)
+        db.session.commit()
+
+        entries, older = read_timeline(self.followers[0].id, page_size=2)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         newer.id, older_workouts[1].id])
+
+        entries, older = read_timeline(
+            self.followers[0].id, before=older, page_size=2)
+        self.assertEqual([entry.workout_id for entry in entries], [
+                         older_workouts[0].id])
@@ -0,0 +1,124 @@
+"""Activity feed for Capstone One Project
+
+Each member's feed of recent workouts by the members they follow is a
+precomputed timeline (the timeline_entries table). Saving a workout fans it
+out to every follower's timeline in batches, and each timeline is capped at
+TIMELINE_LENGTH entries, so reading a feed page is one range scan of the
+(member_id, workout_date, id) index. Feeds are newest workout first, paged by
+(workout_date, id) (keyset pagination), so workouts backfilled from a newly
+followed member sit at their own dates instead of on top.
+"""
+from models import db, Follows, TimelineEntry, Workout, WorkoutExercise, Exercise
+
+
+# followers written per INSERT; each batch is committed on its own so a popular member's
+# workout doesn't hold one long transaction
+FANOUT_BATCH_SIZE = 500
+
+# entries kept per timeline; older ones are trimmed as new ones arrive
+TIMELINE_LENGTH = 300
+
+# a member's workouts copied into a new follower's timeline
+BACKFILL_WORKOUTS = 20
+
+FEED_PAGE_SIZE = 20
+
+
+def trim_timelines(member_ids, timeline_length=TIMELINE_LENGTH):
+    """Delete all but the newest timeline_length entries of each of these members' timelines"""
+
+    ranked = (db.select([TimelineEntry.id,
+                         db.func.row_number().over(partition_by=TimelineEntry.member_id,
+                                                   order_by=(TimelineEntry.workout_date.desc(),
+                                                             TimelineEntry.id.desc())).label('position')])
+              .where(TimelineEntry.member_id.in_(member_ids))
+              .alias('ranked'))
+
+    db.session.execute(TimelineEntry.__table__.delete().where(TimelineEntry.id.in_(
+        db.select([ranked.c.id]).where(ranked.c.position > timeline_length))))
+
+
+def fan_out_workout(workout, exercise_names, batch_size=FANOUT_BATCH_SIZE, timeline_length=TIMELINE_LENGTH):
+    """Put the workout at the top of every follower's timeline, batch_size followers at a time.
+    Commits each batch."""
+
+    summary = ', '.join(dict.fromkeys(exercise_names))
+
+    after = 0
+    while True:
+        # the next batch of followers, in follower id order
+        followers = [follower_id for follower_id, in (db.session
+                                                      .query(Follows.member_following_id)
+                                                      .filter(Follows.member_being_followed_id == workout.member_id,
+                                                              Follows.member_following_id > after)
+                                                      .order_by(Follows.member_following_id)
+                                                      .limit(batch_size))]
+
+        if not followers:
+            break
+
+        # a workout is listed once per timeline; saving more exercises to it replaces its entry, moving it back
+        # to the top of its day
+        db.session.execute(TimelineEntry.__table__.delete().where(
+            db.and_(TimelineEntry.workout_id == workout.id, TimelineEntry.member_id.in_(followers))))
+
+        db.session.execute(TimelineEntry.__table__.insert(), [
+            {'member_id': follower_id, 'author_id': workout.member_id, 'workout_id': workout.id,
+             'workout_date': workout.workout_date, 'exercise_names': summary} for follower_id in followers])
+        trim_timelines(followers, timeline_length)
+        db.session.commit()
+
+        after = followers[-1]
+
+    db.session.commit()
+
+
+def backfill_timeline(member_id, author_id, workouts=BACKFILL_WORKOUTS):
+    """Add the author's most recent workouts to a new follower's timeline, oldest first so the newest is on top"""
+
+    recent = (db.session
+              .query(Workout.id, Workout.workout_date)
+              .filter(Workout.member_id == author_id)
+              .order_by(Workout.workout_date.desc())
+              .limit(workouts)
+              .subquery())
+
+    names = {}
+    for workout_id, workout_date, name in (db.session
+                                           .query(recent.c.id, recent.c.workout_date, Exercise.name)
+                                           .join(WorkoutExercise, db.and_(WorkoutExercise.workout_id == recent.c.id,
+                                                                          WorkoutExercise.workout_date == recent.c.workout_date))
+                                           .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+                                           .order_by(recent.c.workout_date, WorkoutExercise.id)):
+        names.setdefault((workout_id, workout_date), []).append(name)
+
+    if names:
+        db.session.execute(TimelineEntry.__table__.insert(), [
+            {'member_id': member_id, 'author_id': author_id, 'workout_id': workout_id,
+             'workout_date': workout_date, 'exercise_names': ', '.join(dict.fromkeys(exercise_names))}
+            for (workout_id, workout_date), exercise_names in names.items()])
+        trim_timelines([member_id])
+
+
+def read_timeline(member_id, before=None, page_size=FEED_PAGE_SIZE):
+    """Return a page of the member's feed, newest workout first: the entries after the (workout_date, id) `before`
+    (all if None), and the (workout_date, id) to pass as `before` for the next page, or None if this is the last page"""
+
+    query = TimelineEntry.query.filter(TimelineEntry.member_id == member_id)
+
+    if before:
+        query = query.filter(db.tuple_(
+            TimelineEntry.workout_date, TimelineEntry.id) < db.tuple_(*before))
+
+    # one extra entry is retrieved to find out whether there's another page
+    entries = (query
+               .options(db.joinedload(TimelineEntry.author))
+               .order_by(TimelineEntry.workout_date.desc(), TimelineEntry.id.desc())
+               .limit(page_size + 1)
+               .all())
+
+    if len(entries) > page_size:
+        last = entries[page_size - 1]
+        return entries[:page_size], (last.workout_date, last.id)
+
+    return entries, None
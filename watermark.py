@@ -0,0 +1,70 @@
+"""Catching up on a table's new rows for Capstone One Project
+
+Workers keep in-memory views of some tables (exercise recommendations, the
+exercise name index) and catch them up by reading only rows added since the
+last catch up. Rows are told apart by their serial id, but an id is taken when
+a row is inserted and the row only shows up when its transaction commits, so
+ids show up out of order: a row can appear below ids already read. IdWatermark
+tracks which ids have been read, including the ones still to come below the
+highest id read.
+"""
+import time
+
+from models import db
+
+
+class IdWatermark:
+    """The ids of a table's rows already read: every id up to `value`, except the ones in `gaps`. Not thread safe;
+    callers hold their own lock around it along with the data it tracks"""
+
+    def __init__(self, gap_timeout=300, max_gaps=10000):
+        self.gap_timeout = gap_timeout
+        self.max_gaps = max_gaps
+        # highest id read
+        self.value = 0
+        # ids below value that weren't there when it passed them, and when they were first missed. Each catch up
+        # looks for these again, until they're older than gap_timeout seconds (rolled back or deleted rows)
+        self.gaps = {}
+
+    def reset(self, value, missing=()):
+        """Start from `value`, with the ids in `missing` below it not read yet"""
+
+        now = time.time()
+        self.value = value
+        self.gaps = {row_id: now for row_id in missing}
+
+    def unread(self, id_column):
+        """Return a filter on id_column for the rows not read yet, after giving up on gaps older than gap_timeout"""
+
+        now = time.time()
+        self.gaps = {row_id: missed for row_id, missed in self.gaps.items()
+                     if now - missed < self.gap_timeout}
+
+        unread = id_column > self.value
+        if self.gaps:
+            unread = db.or_(unread, id_column.in_(self.gaps.keys()))
+
+        return unread
+
+    def is_read(self, row_id):
+        """Whether the row with this id was read before"""
+
+        return row_id <= self.value and row_id not in self.gaps
+
+    def advance(self, read_ids):
+        """Mark read_ids, as returned by a query filtered with unread(), as read. Ids skipped on the way up to the
+        highest of them are rows that haven't committed yet, and become gaps"""
+
+        if not read_ids:
+            return
+
+        now = time.time()
+
+        for row_id in read_ids:
+            self.gaps.pop(row_id, None)
+
+        highest = max(read_ids)
+        self.gaps.update((row_id, now) for row_id in range(max(self.value, highest - self.max_gaps) + 1, highest)
+                         if row_id not in read_ids)
+
+        self.value = max(self.value, highest)